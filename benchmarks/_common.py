@@ -0,0 +1,14 @@
+import os
+import subprocess
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def git_revision() -> str:
+    """Возвращает хеш текущего коммита или пустую строку вне git."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=SCRIPT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
@@ -0,0 +1,316 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from functools import partial
+
+from openpyxl import Workbook
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(SCRIPT_DIR, ".."))
+
+import json_task as jt
+import logger as lg
+from _common import git_revision
+
+ROWS = [10**3, 10**4]
+COLUMNS = 20
+SPARSITY = 0.1
+NUMERIC_SHARE = 0.5
+REPEATS = 3
+HEADER_Y = 2
+FIRST_ROW_Y = 4
+CURRENCIES = ("RUB", "USD", "EUR", "CNY")
+ELEMENT_TEMPLATE = {
+    "Type": "LABEL",
+    "Id": "",
+    "Sid": "",
+    "Value": "",
+    "Name": "",
+    "Enabled": "true",
+    "Readonly": "true",
+    "Visible": "true",
+    "Focused": "false",
+    "Available": "true",
+    "X": "",
+    "Y": "",
+    "Width": "",
+    "Height": "1",
+    "DiagName": "",
+    "ForeColor": "0",
+    "BackColor": "12",
+    "HasContextMenu": "false",
+    "Text": "",
+    "QuickInfo": "",
+    "IconId": "",
+    "AlignmentRight": "false",
+    "IconRight": "false",
+    "ProportionalFont": "false",
+    "Clickable": "false",
+    "MaxLength": "",
+    "Highlighted": "false",
+    "Numeric": "false",
+    "Hotspot": "false",
+    "VisualType": "0",
+}
+
+
+def _group_thousands(value: float, separator: str) -> str:
+    integer, fraction = f"{abs(value):,.2f}".split(".")
+    return f"{integer.replace(',', separator)},{fraction}"
+
+
+NUMBER_FORMATS = {
+    "plain": lambda v: ("-" if v < 0 else "") + _group_thousands(v, " "),
+    "trailing_minus": lambda v: " " + _group_thousands(v, " ") + ("-" if v < 0 else ""),
+    "dotted": lambda v: _group_thousands(v, ".") + ("-" if v < 0 else ""),
+    "nbsp": lambda v: ("- " if v < 0 else "") + _group_thousands(v, "\u00a0"),
+}
+
+
+def make_element(number: int, x: int, y: int, width: int, text: str, quick_info: str = "") -> dict:
+    """
+    Формирует элемент дампа SAP GUI со всеми свойствами реального экрана.
+
+    :param number: порядковый номер элемента для Id и Name
+    :param x: позиция по горизонтали
+    :param y: позиция по вертикали
+    :param width: ширина поля
+    :param text: текст поля
+    :param quick_info: всплывающая подсказка, у заголовков - полное название столбца
+    :returns: элемент вида {"properties": {...}}
+    """
+    properties = dict(ELEMENT_TEMPLATE)
+    properties.update(
+        Id=f"ses[0]/wnd[0]/usrUSRAREA/lbl[{number}]",
+        Sid=f"wnd[0]/usr/lbl[{x},{y}]",
+        Name=f"lbl[{number}]",
+        X=str(x),
+        Y=str(y),
+        Width=str(width),
+        MaxLength=str(width),
+        Text=text,
+        QuickInfo=quick_info,
+    )
+    return {"properties": properties}
+
+
+def write_dump(
+    path: str,
+    columns: int = COLUMNS,
+    rows: int = ROWS[0],
+    sparsity: float = SPARSITY,
+    numeric_share: float = NUMERIC_SHARE,
+    formats: tuple[str, ...] = tuple(NUMBER_FORMATS),
+    seed: int = 0,
+) -> str:
+    """
+    Пишет синтетический дамп SAP GUI в схеме headers/values + properties, как test1.json.
+
+    Часть столбцов числовые: суммы в одном из форматов formats, в том числе с минусом в конце.
+    Остальные - счета Главной книги и валюты. Элементы строки перемешаны, как в настоящих дампах.
+    Файл пишется поэлементно, поэтому генерация не держит дамп в памяти.
+
+    :param path: путь к файлу
+    :param columns: число столбцов
+    :param rows: число строк значений
+    :param sparsity: доля пропущенных ячеек значений
+    :param numeric_share: доля числовых столбцов
+    :param formats: форматы чисел, ключи NUMBER_FORMATS; у каждого числового столбца свой
+    :param seed: зерно генератора случайных чисел
+    :returns: путь к файлу
+    """
+    rng = random.Random(seed)
+    numeric = [i < round(columns * numeric_share) for i in range(columns)]
+    rng.shuffle(numeric)
+    layout = []
+    x = 2
+    for i in range(columns):
+        width = 16 if numeric[i] else 10
+        layout.append((x, width, NUMBER_FORMATS[formats[i % len(formats)]] if numeric[i] else None))
+        x += width + 1
+
+    def value_text(i: int) -> str:
+        if layout[i][2] is not None:
+            return layout[i][2](round(rng.uniform(-1e6, 1e6), 2))
+        if i % 2:
+            return rng.choice(CURRENCIES)
+        return f"{rng.randint(10, 99)}-{rng.randint(0, 999999):06d}"
+
+    number = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"headers": [')
+        for i, (x, width, fmt) in enumerate(layout):
+            number += 1
+            title = f"Сумма {i + 1}" if fmt else f"Поле {i + 1}"
+            element = make_element(number, x, HEADER_Y, width, title[:width], f"{title} (столбец {i + 1})")
+            f.write(("," if i else "") + json.dumps(element, ensure_ascii=False))
+        f.write('], "values": [')
+        first = True
+        for r in range(rows):
+            cells = [i for i in range(columns) if rng.random() >= sparsity]
+            rng.shuffle(cells)
+            for i in cells:
+                number += 1
+                x, width, _ = layout[i]
+                element = make_element(number, x, FIRST_ROW_Y + r, width, value_text(i))
+                f.write(("" if first else ",") + json.dumps(element, ensure_ascii=False))
+                first = False
+        f.write("]}")
+    return path
+
+
+def measure(func: Callable, repeats: int = REPEATS, trace_memory: bool = True) -> tuple[object, dict]:
+    """
+    Замеряет время вызова функции несколько раз и пик памяти отдельным прогоном под tracemalloc.
+
+    Прогон под tracemalloc в несколько раз медленнее обычного, поэтому на больших дампах его можно отключить.
+
+    :param func: функция без аргументов
+    :param repeats: число повторов для замера времени
+    :param trace_memory: замерять пик памяти
+    :returns: результат последнего вызова и замеры: минимальное и среднее время в секундах, пик памяти в МиБ
+    """
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    peak = None
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            result = func()
+            peak = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    return result, {"min_s": min(timings), "mean_s": sum(timings) / len(timings), "peak_mib": peak}
+
+
+def run_benchmark(path: str, output_dir: str, repeats: int = REPEATS, trace_memory: bool = True) -> dict:
+    """
+    Замеряет этапы json_task на одном дампе: разбор, выравнивание, числа, заполнение, границы, сохранение
+    и потоковую запись.
+
+    :param path: путь к дампу
+    :param output_dir: каталог для сохраняемых книг
+    :param repeats: число повторов каждого этапа
+    :param trace_memory: замерять пик памяти
+    :returns: замеры по этапам
+    """
+    stages = {}
+    measure_stage = partial(measure, repeats=repeats, trace_memory=trace_memory)
+
+    def load_json() -> dict:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    data, stages["parse_json"] = measure_stage(load_json)
+    _, stages["parse_elements"] = measure_stage(lambda: jt.load_elements(path))
+    _, stages["parse_stream"] = measure_stage(lambda: jt.load_elements(path, "json"))
+    (header, rows), stages["align"] = measure_stage(lambda: jt.prepare_sheet_data(data))
+    (typed_rows, number_formats), stages["normalize"] = measure_stage(
+        lambda: jt.normalize_numeric_columns(header, rows)
+    )
+
+    def fill() -> Workbook:
+        wb = Workbook()
+        jt.fill_worksheet_grid(header, rows, wb.active)
+        return wb
+
+    wb, stages["fill"] = measure_stage(fill)
+    _, stages["borders"] = measure_stage(lambda: jt.add_borders_to_cells(wb.active))
+    _, stages["save"] = measure_stage(lambda: wb.save(os.path.join(output_dir, "classic.xlsx")))
+
+    def write_streaming() -> None:
+        streaming = Workbook(write_only=True)
+        jt.write_sheet_streaming(streaming, "sheet", header, typed_rows, number_formats)
+        streaming.save(os.path.join(output_dir, "streaming.xlsx"))
+
+    _, stages["streaming_write"] = measure_stage(write_streaming)
+    return {"file_mib": os.path.getsize(path) / 2**20, "grid_rows": len(rows), "stages": stages}
+
+
+def run_suite(
+    rows: list[int],
+    columns: int = COLUMNS,
+    sparsity: float = SPARSITY,
+    numeric_share: float = NUMERIC_SHARE,
+    formats: tuple[str, ...] = tuple(NUMBER_FORMATS),
+    repeats: int = REPEATS,
+    trace_memory: bool = True,
+    seed: int = 0,
+) -> dict:
+    """
+    Генерирует дампы всех размеров во временной директории и замеряет на них этапы json_task.
+
+    :param rows: список чисел строк
+    :param columns: число столбцов
+    :param sparsity: доля пропущенных ячеек
+    :param numeric_share: доля числовых столбцов
+    :param formats: форматы чисел
+    :param repeats: число повторов каждого этапа
+    :param trace_memory: замерять пик памяти
+    :param seed: зерно генератора
+    :returns: результаты с метаданными окружения
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in rows:
+            path = write_dump(
+                os.path.join(tmp, f"dump_{count}.json"), columns, count, sparsity, numeric_share, formats, seed
+            )
+            result = {"rows": count, "columns": columns, "sparsity": sparsity}
+            result.update(run_benchmark(path, tmp, repeats, trace_memory))
+            results.append(result)
+            os.remove(path)
+    return {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "orjson": jt.orjson is not None,
+        "formats": list(formats),
+        "results": results,
+    }
+
+
+def get_cmd_args() -> argparse.Namespace:
+    """Парсер аргументов командной строки."""
+    parser = argparse.ArgumentParser(prog="Бенчмарк json_task")
+    parser.add_argument("--rows", type=int, nargs="+", default=ROWS, help="Числа строк дампов")
+    parser.add_argument("--columns", type=int, default=COLUMNS, help="Число столбцов")
+    parser.add_argument("--sparsity", type=float, default=SPARSITY, help="Доля пропущенных ячеек")
+    parser.add_argument("--numeric-share", type=float, default=NUMERIC_SHARE, help="Доля числовых столбцов")
+    parser.add_argument(
+        "--formats", nargs="+", choices=sorted(NUMBER_FORMATS), default=list(NUMBER_FORMATS), help="Форматы чисел"
+    )
+    parser.add_argument("--repeats", type=int, default=REPEATS, help="Число повторов каждого этапа")
+    parser.add_argument("--no-memory", action="store_true", help="Не замерять пик памяти (быстрее на больших дампах)")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно генератора данных")
+    parser.add_argument("--generate", help="Только сгенерировать дамп в файл (первое из --rows строк) и выйти")
+    parser.add_argument("--output", help="Файл для сохранения результатов в json, по умолчанию вывод в консоль")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_cmd_args()
+    # Отчёт без --output печатается в stdout, поэтому логи туда не выводятся.
+    lg.setup_logging(console=False)
+    formats = tuple(args.formats)
+    if args.generate:
+        write_dump(args.generate, args.columns, args.rows[0], args.sparsity, args.numeric_share, formats, args.seed)
+        sys.exit()
+    report = run_suite(
+        args.rows, args.columns, args.sparsity, args.numeric_share, formats, args.repeats, not args.no_memory, args.seed
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
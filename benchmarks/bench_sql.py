@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from collections.abc import Iterator
+from itertools import accumulate
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(SCRIPT_DIR, ".."))
+
+import logger as lg
+import sql_task as st
+from _common import git_revision
+
+SIZES = [10**3, 10**4, 10**5]
+ZIPF_EXPONENT = 1.1
+REPEATS = 3
+QUERIES = {
+    "clients_with_purchases_sum": st.return_clients_with_purchases_sum,
+    "clients_who_bought_phone": st.return_clients_who_bought_phone,
+    "customs_count_by_name": st.return_customs_count_by_name,
+    "clients_with_purchases_sum_from_summary": st.return_clients_with_purchases_sum_from_summary,
+    "customs_count_by_name_from_summary": st.return_customs_count_by_name_from_summary,
+}
+
+
+def zipf_weights(n: int, exponent: float = ZIPF_EXPONENT) -> list[float]:
+    """
+    Накопленные веса распределения Ципфа: немногие клиенты и товары получают большую часть заказов.
+
+    :param n: число элементов
+    :param exponent: показатель распределения
+    :returns: накопленные веса для random.choices
+    """
+    return list(accumulate(1 / (rank**exponent) for rank in range(1, n + 1)))
+
+
+def generate_dataset(orders: int, seed: int = 0) -> tuple[Iterator, list[tuple], Iterator]:
+    """
+    Генерирует набор данных заданного размера с перекосом по клиентам и товарам.
+
+    Клиентов в 20 раз меньше, чем заказов, товаров - не больше 5000; один из товаров - телефон.
+    Клиенты и заказы отдаются генераторами, поэтому даже 10^7 заказов не держатся в памяти.
+
+    :param orders: число заказов
+    :param seed: зерно генератора случайных чисел
+    :returns: клиенты, товары и заказы для bulk_load
+    """
+    rng = random.Random(seed)
+    clients_count = max(orders // 20, 1)
+    products_count = min(max(orders // 100, 2), 5000)
+    products = [(f"Товар {i}", round(rng.uniform(10, 20000), 2)) for i in range(products_count - 1)]
+    products.insert(rng.randrange(products_count), (st.PHONE_PRODUCT_NAME, 9999.9))
+
+    def clients() -> Iterator[tuple]:
+        for i in range(clients_count):
+            yield (f"Клиент {i}",)
+
+    def order_rows() -> Iterator[tuple]:
+        client_ids = range(1, clients_count + 1)
+        product_ids = range(1, products_count + 1)
+        client_weights = zipf_weights(clients_count)
+        product_weights = zipf_weights(products_count)
+        chunk = 10000
+        for start in range(0, orders, chunk):
+            k = min(chunk, orders - start)
+            picked_clients = rng.choices(client_ids, cum_weights=client_weights, k=k)
+            picked_products = rng.choices(product_ids, cum_weights=product_weights, k=k)
+            for i, (client_id, product_id) in enumerate(zip(picked_clients, picked_products), start):
+                yield client_id, product_id, f"Закупка {i}"
+
+    return clients(), products, order_rows()
+
+
+def time_call(func: callable, repeats: int = REPEATS) -> dict:
+    """
+    Замеряет время вызова функции несколько раз.
+
+    :param func: функция без аргументов
+    :param repeats: число повторов
+    :returns: минимальное и среднее время в секундах и число строк результата
+    """
+    timings = []
+    rows = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+        rows = len(result)
+    return {"min_s": min(timings), "mean_s": sum(timings) / len(timings), "rows": rows}
+
+
+def run_benchmark(orders: int, path: str = ":memory:", batch_size: int = st.BATCH_SIZE, seed: int = 0) -> dict:
+    """
+    Загружает набор данных одного размера и замеряет загрузку и отчётные запросы.
+
+    :param orders: число заказов
+    :param path: путь к базе данных, по умолчанию в памяти
+    :param batch_size: размер пачки bulk_load
+    :param seed: зерно генератора
+    :returns: результаты замеров
+    """
+    users, products, order_rows = generate_dataset(orders, seed)
+    with sqlite3.connect(path) as connection:
+        cursor = connection.cursor()
+        start = time.perf_counter()
+        stats = st.bulk_load(cursor, users=users, products=products, orders=order_rows, batch_size=batch_size)
+        load_s = time.perf_counter() - start
+        result = {
+            "orders": orders,
+            "load": {
+                "total_s": load_s,
+                "tables": {table: {"rows": rows, "seconds": seconds} for table, (rows, seconds) in stats.items()},
+                "orders_per_s": stats["orders"][0] / max(stats["orders"][1], 1e-9),
+            },
+            "queries": {name: time_call(lambda q=query: q(cursor)) for name, query in QUERIES.items()},
+        }
+    connection.close()
+    return result
+
+
+def run_suite(sizes: list[int], in_memory: bool = True, batch_size: int = st.BATCH_SIZE, seed: int = 0) -> dict:
+    """
+    Прогоняет замеры для всех размеров на новых базах в памяти или во временной директории.
+
+    :param sizes: список чисел заказов
+    :param in_memory: использовать :memory:, иначе временный файл
+    :param batch_size: размер пачки bulk_load
+    :param seed: зерно генератора
+    :returns: результаты с метаданными окружения
+    """
+    results = []
+    for orders in sizes:
+        if in_memory:
+            results.append(run_benchmark(orders, ":memory:", batch_size, seed))
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                results.append(run_benchmark(orders, os.path.join(tmp, "bench.db"), batch_size, seed))
+    return {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "storage": "memory" if in_memory else "file",
+        "results": results,
+    }
+
+
+def get_cmd_args() -> argparse.Namespace:
+    """Парсер аргументов командной строки."""
+    parser = argparse.ArgumentParser(prog="Бенчмарк sql_task")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="Числа заказов, например 1000 10000000")
+    parser.add_argument("--file", action="store_true", help="Базы во временных файлах вместо :memory:")
+    parser.add_argument("--batch-size", type=int, default=st.BATCH_SIZE, help="Размер пачки загрузки")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно генератора данных")
+    parser.add_argument("--output", help="Файл для сохранения результатов в json, по умолчанию вывод в консоль")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_cmd_args()
+    # Отчёт без --output печатается в stdout, поэтому логи туда не выводятся.
+    lg.setup_logging(console=False)
+    report = run_suite(args.sizes, not args.file, args.batch_size, args.seed)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
@@ -1,44 +1,511 @@
 import argparse
 import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from functools import partial, wraps
+from urllib.parse import urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
 
 import logger as lg
+import metrics
 
+PAYMENT_DETAILS_URL = "https://service.nalog.ru/addrno-proc.json"
+HEADERS = {
+    "Accept": "application/json, text/javascript, */*; q=0.01",
+    "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+}
+WORKERS = 8
+RATE_LIMIT = 10.0
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10.0
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+ATTEMPT_TIMER = "http_request_attempt_seconds"
+CIRCUIT_OPEN_COUNTER = "http_request_circuit_open_total"
 
-def get_payment_details(ifns: int, oktmmf: int) -> dict:
-    """Получает данные платёжных реквизитов по введённым коду ИФНС и муниципальному образованию с сайта ФНС РФ."""
-    headers = {
-        "Accept": "application/json, text/javascript, */*; q=0.01",
-        "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-    }
-    r = requests.post(
-        "https://service.nalog.ru/addrno-proc.json",
-        headers=headers,
+
+class InvalidPaymentCodeError(requests.exceptions.HTTPError):
+    """Сервис отклонил пару кодов ИФНС и муниципального образования."""
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Автомат разомкнут: сервис недавно недоступен, запрос не отправлялся."""
+
+
+def get_payment_details(
+    ifns: int,
+    oktmmf: int,
+    session: requests.Session = None,
+    url: str = PAYMENT_DETAILS_URL,
+    timeout: float | tuple[float, float] = (CONNECT_TIMEOUT, READ_TIMEOUT),
+) -> dict:
+    """
+    Получает данные платёжных реквизитов по введённым коду ИФНС и муниципальному образованию с сайта ФНС РФ.
+
+    Делает ровно одну попытку, повторы и автомат выполняет fetch_payment_details.
+
+    :param ifns: код ИФНС
+    :param oktmmf: муниципальное образование
+    :param session: сессия requests для переиспользования подключений, по умолчанию requests.post
+    :param url: адрес сервиса
+    :param timeout: таймаут в секундах или пара (таймаут подключения, таймаут чтения)
+    :returns: платёжные реквизиты
+    :raises requests.exceptions.HTTPError: при любом ответе, кроме 200
+    """
+    post = requests.post if session is None else session.post
+    r = post(
+        url,
+        headers=HEADERS,
         data={"c": "next", "step": 1, "npKind": "fl", "ifns": ifns, "oktmmf": oktmmf},
-        timeout=0.1,
+        timeout=timeout,
     )
-    print(r.status_code)
+    lg.get_logger().debug(f"Код ответа сервера: {r.status_code}")
     if r.status_code == 200:
         return json.loads(r.text)["payeeDetails"]
-    else:
-        raise r.raise_for_status()
+    r.raise_for_status()
+    raise requests.exceptions.HTTPError(f"Неожиданный ответ сервера: {r.status_code}", response=r)
+
+
+class LatencyStats:
+    """Потокобезопасный журнал длительности последних попыток запроса с их исходами."""
+
+    def __init__(self, size: int = 1000):
+        self.attempts = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, outcome: str) -> None:
+        """
+        Записывает попытку.
+
+        :param seconds: длительность попытки
+        :param outcome: исход: "ok", код ответа или имя исключения
+        """
+        with self._lock:
+            self.attempts.append((seconds, outcome))
+
+    def quantile(self, q: float) -> float | None:
+        """Квантиль длительности успешных попыток, None если их ещё не было."""
+        with self._lock:
+            latencies = sorted(seconds for seconds, outcome in self.attempts if outcome == "ok")
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+
+ATTEMPT_STATS = LatencyStats()
+
+
+class RequestPolicy:
+    """
+    Политика запроса: таймауты, повторы с экспоненциальной задержкой и полным джиттером.
+
+    Таймаут чтения адаптивный: после накопления статистики он равен p95 успешных попыток,
+    умноженному на read_timeout_factor, но не меньше min_read_timeout и не больше read_timeout.
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        read_timeout: float = READ_TIMEOUT,
+        min_read_timeout: float = 1.0,
+        read_timeout_factor: float = 3.0,
+        retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        retry_statuses: frozenset[int] = RETRY_STATUSES,
+    ):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.min_read_timeout = min_read_timeout
+        self.read_timeout_factor = read_timeout_factor
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_statuses = retry_statuses
+
+    def timeout(self, stats: LatencyStats = None) -> tuple[float, float]:
+        """Пара (таймаут подключения, таймаут чтения) с учётом статистики задержек."""
+        p95 = stats.quantile(0.95) if stats is not None else None
+        if p95 is None:
+            return self.connect_timeout, self.read_timeout
+        read = min(self.read_timeout, max(self.min_read_timeout, p95 * self.read_timeout_factor))
+        return self.connect_timeout, read
+
+    def is_retryable(self, error: Exception) -> bool:
+        """Повторять ли попытку после ошибки: таймауты, обрывы соединения и коды retry_statuses."""
+        if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+            return True
+        response = getattr(error, "response", None)
+        return response is not None and response.status_code in self.retry_statuses
+
+    def delay(self, attempt: int, error: Exception = None) -> float:
+        """
+        Пауза перед повтором номер attempt (с нуля).
+
+        Заголовок Retry-After ответа имеет приоритет над расчётной задержкой, но ограничен max_backoff.
+        """
+        retry_after = parse_retry_after(getattr(getattr(error, "response", None), "headers", {}).get("Retry-After"))
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Разбирает заголовок Retry-After: число секунд или HTTP-дата.
+
+    :param value: значение заголовка
+    :returns: пауза в секундах или None, если заголовка нет или он некорректен
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель: после failure_threshold сбоев подряд запросы сразу отклоняются
+    CircuitOpenError в течение reset_timeout секунд, затем пропускается одна пробная попытка.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Состояние: "closed", "open" или "half-open"."""
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def before_call(self) -> None:
+        """Пропускает запрос или выбрасывает CircuitOpenError, пока автомат разомкнут."""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._probing:
+                raise CircuitOpenError("Сервис недоступен, запрос отклонён автоматом")
+            self._probing = True
+
+    def record_success(self) -> None:
+        """Сервис ответил: замыкает автомат."""
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        """Сбой сервиса: после порога или неудачной пробной попытки размыкает автомат."""
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+def _record_attempt(stats: LatencyStats, seconds: float, outcome: str) -> None:
+    stats.record(seconds, outcome)
+    metrics.observe(ATTEMPT_TIMER, seconds, outcome=outcome)
 
 
-def get_cmd_args() -> str:
+def fetch_payment_details(
+    ifns: int,
+    oktmmf: int,
+    session: requests.Session = None,
+    url: str = PAYMENT_DETAILS_URL,
+    policy: RequestPolicy = None,
+    breaker: CircuitBreaker = None,
+    stats: LatencyStats = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> dict:
+    """
+    Получает платёжные реквизиты с повторами по политике и через автоматический выключатель.
+
+    Таймауты, обрывы соединения и ответы из policy.retry_statuses повторяются с паузой policy.delay,
+    остальные ошибки (в том числе неверные коды) выбрасываются сразу. Для автомата ответ о неверных кодах
+    (is_invalid_code_error) считается успешным, а любое другое исключение - сбоем, в том числе неповторяемые
+    ответы 5xx и ответ 200 не в json. Длительность каждой попытки записывается в stats.
+
+    :param ifns: код ИФНС
+    :param oktmmf: муниципальное образование
+    :param session: сессия requests
+    :param url: адрес сервиса
+    :param policy: политика таймаутов и повторов, по умолчанию RequestPolicy()
+    :param breaker: автоматический выключатель, по умолчанию не используется
+    :param stats: журнал длительности попыток, по умолчанию общий ATTEMPT_STATS
+    :param sleep: функция ожидания между попытками
+    :returns: платёжные реквизиты
+    """
+    policy = policy or RequestPolicy()
+    stats = ATTEMPT_STATS if stats is None else stats
+    logger = lg.get_logger()
+    for attempt in range(policy.retries + 1):
+        if breaker is not None:
+            try:
+                breaker.before_call()
+            except CircuitOpenError:
+                metrics.inc(CIRCUIT_OPEN_COUNTER)
+                raise
+        start = time.perf_counter()
+        outcome = "interrupted"
+        try:
+            details = get_payment_details(ifns, oktmmf, session, url, timeout=policy.timeout(stats))
+            outcome = "ok"
+        except Exception as e:
+            response = getattr(e, "response", None)
+            outcome = str(response.status_code) if response is not None else type(e).__name__
+            # Неверные коды - исправный ответ сервиса. Любая другая ошибка, включая ответ 200 не в json, - сбой:
+            # иначе пробная попытка не завершится и автомат останется разомкнутым навсегда.
+            if breaker is not None:
+                if is_invalid_code_error(e):
+                    breaker.record_success()
+                else:
+                    breaker.record_failure()
+            retryable = isinstance(e, requests.exceptions.RequestException) and policy.is_retryable(e)
+            if not retryable or attempt == policy.retries:
+                raise
+            error = e
+        finally:
+            _record_attempt(stats, time.perf_counter() - start, outcome)
+        if outcome == "ok":
+            if breaker is not None:
+                breaker.record_success()
+            return details
+        delay = policy.delay(attempt, error)
+        logger.debug(f"Попытка {attempt + 1} для {ifns}/{oktmmf} не удалась ({error}), повтор через {delay:.2f} с")
+        sleep(delay)
+
+
+def is_invalid_code_error(error: Exception) -> bool:
+    """
+    Проверяет, что ошибка запроса означает неверные коды, а не временный сбой.
+
+    Неверными считаются коды, на которые сервис ответил 4xx (кроме 429) или ответом без реквизитов.
+
+    :param error: исключение, выброшенное при запросе
+    """
+    if isinstance(error, (KeyError, InvalidPaymentCodeError)):
+        return True
+    response = getattr(error, "response", None)
+    return response is not None and 400 <= response.status_code < 500 and response.status_code != 429
+
+
+def create_session(pool_size: int = WORKERS) -> requests.Session:
+    """
+    Создаёт сессию с пулом keep-alive подключений на pool_size соединений к одному хосту.
+
+    :param pool_size: размер пула подключений
+    :returns: сессия requests
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class HostRateLimiter:
+    """Потокобезопасный ограничитель частоты запросов: не больше rate запросов в секунду на каждый хост."""
+
+    def __init__(self, rate: float = RATE_LIMIT):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host: str) -> None:
+        """Ждёт, пока для хоста освободится очередной слот."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next.get(host, now), now)
+            self._next[host] = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def rate_limited(
+    fetch: Callable[[int, int], dict], rate: float = RATE_LIMIT, url: str = PAYMENT_DETAILS_URL
+) -> Callable[[int, int], dict]:
+    """
+    Оборачивает функцию запроса реквизитов так, что она вызывается не чаще rate раз в секунду.
+
+    Ограничивать нужно именно сетевую функцию, а не её обёртку с кешем, иначе попадания в кеш
+    ждут очереди наравне с запросами к сервису.
+
+    :param fetch: функция запроса реквизитов по паре
+    :param rate: максимум вызовов в секунду, 0 - без ограничения
+    :param url: адрес сервиса, частота ограничивается на его хост
+    :returns: функция с тем же интерфейсом
+    """
+    limiter = HostRateLimiter(rate)
+    host = urlparse(url).netloc
+
+    @wraps(fetch)
+    def inner(ifns: int, oktmmf: int) -> dict:
+        limiter.wait(host)
+        return fetch(ifns, oktmmf)
+
+    return inner
+
+
+def lookup_many(
+    pairs: Iterable[tuple[int, int]],
+    workers: int = WORKERS,
+    rate: float = RATE_LIMIT,
+    session: requests.Session = None,
+    url: str = PAYMENT_DETAILS_URL,
+    fetch: Callable[[int, int], dict] = None,
+) -> Iterator[dict]:
+    """
+    Получает платёжные реквизиты для множества пар (ifns, oktmmf) с ограниченным параллелизмом.
+
+    Запросы идут через одну сессию с keep-alive, с ограничением частоты на хост. Результаты отдаются
+    в порядке входных пар, в работе одновременно не больше 2 * workers запросов, поэтому вход
+    читается лениво. Ошибка запроса не прерывает обработку: она попадает в поле "error" результата.
+
+    :param pairs: пары (код ИФНС, муниципальное образование)
+    :param workers: число потоков
+    :param rate: максимум запросов в секунду на хост для fetch по умолчанию, 0 - без ограничения
+    :param session: сессия requests, по умолчанию создаётся create_session
+    :param url: адрес сервиса
+    :param fetch: функция запроса реквизитов по паре, по умолчанию fetch_payment_details через сессию
+        с общим на пакет автоматическим выключателем. Своя функция ограничивает частоту запросов сама
+        (rate_limited), чтобы под ограничение не попадали, например, ответы из кеша
+    :returns: итератор словарей с полями ifns, oktmmf и payeeDetails или error (и invalid для неверных кодов)
+    """
+    own_session = session is None and fetch is None
+    session = create_session(workers) if own_session else session
+    if fetch is None:
+        fetch = rate_limited(
+            partial(fetch_payment_details, session=session, url=url, breaker=CircuitBreaker()), rate, url
+        )
+
+    def lookup(ifns: int, oktmmf: int) -> dict:
+        try:
+            return {"ifns": ifns, "oktmmf": oktmmf, "payeeDetails": fetch(ifns, oktmmf)}
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            result = {"ifns": ifns, "oktmmf": oktmmf, "error": str(e) or type(e).__name__}
+            if is_invalid_code_error(e):
+                result["invalid"] = True
+            return result
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for ifns, oktmmf in pairs:
+                pending.append(executor.submit(lookup, ifns, oktmmf))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    finally:
+        if own_session:
+            session.close()
+
+
+def read_pairs(lines: Iterable[str]) -> Iterator[tuple[int, int]]:
+    """
+    Читает пары (ifns, oktmmf) из строк JSONL вида {"ifns": 7707, "oktmmf": 45382000}.
+
+    :param lines: строки входного файла
+    :returns: итератор пар
+    """
+    for line in lines:
+        if line.strip():
+            record = json.loads(line)
+            yield int(record["ifns"]), int(record["oktmmf"])
+
+
+def run_batch(
+    input_path: str,
+    output_path: str = None,
+    workers: int = WORKERS,
+    rate: float = RATE_LIMIT,
+    url: str = PAYMENT_DETAILS_URL,
+    fetch: Callable[[int, int], dict] = None,
+) -> int:
+    """
+    Пакетный режим: читает пары из JSONL и построчно пишет результаты в JSONL в порядке входа.
+
+    :param input_path: входной JSONL файл
+    :param output_path: выходной JSONL файл, по умолчанию stdout
+    :param workers: число потоков
+    :param rate: максимум запросов в секунду на хост для fetch по умолчанию
+    :param url: адрес сервиса
+    :param fetch: функция запроса реквизитов по паре, например PaymentDetailsCache.get
+    :returns: число обработанных пар
+    """
+    count = 0
+    with open(input_path, encoding="utf-8") as src:
+        out = open(output_path, "w", encoding="utf-8") if output_path else sys.stdout
+        try:
+            for result in lookup_many(read_pairs(src), workers, rate, url=url, fetch=fetch):
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                count += 1
+        finally:
+            if output_path:
+                out.close()
+    return count
+
+
+def get_cmd_args() -> argparse.Namespace:
     """Парсер аргументов Кода ИФНС и Муниципального образования из командной строки."""
     parser = argparse.ArgumentParser(prog="Поисковик платёжных реквизитов")
-    parser.add_argument("ifns", nargs=1, help="Код ИФНС", type=int)
-    parser.add_argument("oktmmf", nargs=1, help="Муниципальное образование", type=int)
-    return parser.parse_args()
+    parser.add_argument("ifns", nargs="?", help="Код ИФНС", type=int)
+    parser.add_argument("oktmmf", nargs="?", help="Муниципальное образование", type=int)
+    parser.add_argument("--batch", help="JSONL файл с парами ifns/oktmmf для пакетной обработки")
+    parser.add_argument("--output", help="JSONL файл для результатов пакетной обработки, по умолчанию stdout")
+    parser.add_argument("--cache", help="Файл SQLite для кеша реквизитов")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Число параллельных запросов")
+    parser.add_argument(
+        "--rate", type=float, default=RATE_LIMIT, help="Максимум запросов в секунду, 0 - без ограничения"
+    )
+    metrics.add_cli_arguments(parser)
+    args = parser.parse_args()
+    if args.batch is None and (args.ifns is None or args.oktmmf is None):
+        parser.error("укажите ifns и oktmmf или --batch")
+    return args
 
 
 if __name__ == "__main__":
     try:
         logger = lg.get_logger()
         args = get_cmd_args()
-        res = get_payment_details(args.ifns, args.oktmmf)
-        logger.info(res)
+        cache = None
+        if args.cache:
+            from payment_cache import PaymentDetailsCache
+
+            cache = PaymentDetailsCache(args.cache, rate=args.rate)
+        with metrics.cli_session(args):
+            if args.batch:
+                count = run_batch(args.batch, args.output, args.workers, args.rate, fetch=cache.get if cache else None)
+                logger.info(f"Обработано пар: {count}")
+            else:
+                res = cache.get(args.ifns, args.oktmmf) if cache else fetch_payment_details(args.ifns, args.oktmmf)
+                logger.info(res)
     except requests.exceptions.Timeout:
         logger.info("Время ожидания ответа от сервера истекло")
     except requests.exceptions.RequestException as e:
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+
+CACHE_DIR = ".json_task_cache"
+INDEX_FILE = "index.json"
+MAX_ENTRIES = 1000
+GRID_VERSION = 2
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def hash_file(file: str) -> str:
+    """
+    Считает sha256 содержимого файла, читая его блоками.
+
+    :param file: путь к файлу
+    :returns: hex-строка хеша
+    """
+    digest = hashlib.sha256()
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_json_atomic(path: str, data) -> None:
+    """
+    Записывает json во временный файл и атомарно подменяет им целевой.
+
+    :param path: путь к файлу
+    :param data: сериализуемые данные
+    """
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+class GridCache:
+    """
+    Персистентный кеш выровненных сеток json'ов.
+
+    Индекс хранит для каждого пути mtime, размер и sha256 содержимого, сами сетки лежат рядом в файлах,
+    названных по хешу, поэтому одинаковые файлы делят одну запись. Пока mtime и размер не изменились,
+    файл даже не перечитывается; при их изменении сверяется хеш. Число записей ограничено,
+    при переполнении вытесняются давно не использованные. При смене GRID_VERSION кеш сбрасывается.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_entries: int = MAX_ENTRIES, rebuild: bool = False):
+        """
+        :param cache_dir: директория кеша
+        :param max_entries: максимальное число файлов в индексе
+        :param rebuild: игнорировать сохранённые сетки и построить всё заново
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.rebuild = rebuild
+        self.hits = 0
+        self.misses = 0
+        self.index = self._load_index()
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.cache_dir, INDEX_FILE)
+
+    def _grid_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        if index.get("version") != GRID_VERSION:
+            index = {"version": GRID_VERSION}
+        index.setdefault("files", {})
+        index.setdefault("outputs", {})
+        index.setdefault("clock", 0)
+        return index
+
+    def _touch(self, entry: dict) -> None:
+        self.index["clock"] += 1
+        entry["used"] = self.index["clock"]
+
+    def lookup(self, file: str) -> tuple[tuple | None, str]:
+        """
+        Ищет сетку файла в кеше.
+
+        :param file: путь к json файлу
+        :returns: сетка или None при промахе, и sha256 содержимого файла
+        """
+        stat = os.stat(file)
+        entry = self.index["files"].get(os.path.abspath(file))
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            digest = entry["sha256"]
+        else:
+            digest = hash_file(file)
+            if entry and entry["sha256"] == digest:
+                entry["mtime_ns"], entry["size"] = stat.st_mtime_ns, stat.st_size
+
+        if entry and entry["sha256"] == digest and not self.rebuild:
+            try:
+                with open(self._grid_path(digest), encoding="utf-8") as f:
+                    header, rows = json.load(f)
+            except (OSError, ValueError):
+                pass
+            else:
+                self._touch(entry)
+                self.hits += 1
+                return (header, rows), digest
+
+        self.misses += 1
+        return None, digest
+
+    def store(self, file: str, digest: str, grid: tuple) -> None:
+        """
+        Сохраняет сетку файла в кеш.
+
+        :param file: путь к json файлу
+        :param digest: sha256 содержимого, полученный из lookup
+        :param grid: заголовки столбцов и строки значений
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        write_json_atomic(self._grid_path(digest), list(grid))
+        stat = os.stat(file)
+        entry = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": digest}
+        self._touch(entry)
+        self.index["files"][os.path.abspath(file)] = entry
+
+    def is_output_fresh(self, name: str, digests: list[str], options: dict = None) -> bool:
+        """
+        Проверяет, что итоговый файл уже собран из тех же json'ов в том же порядке и с теми же настройками.
+
+        :param name: путь к итоговому файлу
+        :param digests: хеши исходных json'ов
+        :param options: настройки конвертации, влияющие на содержимое файла
+        """
+        entry = {"sources": digests, "options": options or {}}
+        return not self.rebuild and os.path.exists(name) and self.index["outputs"].get(name) == entry
+
+    def set_output(self, name: str, digests: list[str], options: dict = None) -> None:
+        """
+        Запоминает, из каких json'ов и с какими настройками собран итоговый файл.
+
+        :param name: путь к итоговому файлу
+        :param digests: хеши исходных json'ов
+        :param options: настройки конвертации, влияющие на содержимое файла
+        """
+        self.index["outputs"][name] = {"sources": digests, "options": options or {}}
+
+    def save(self) -> None:
+        """Вытесняет лишние записи, удаляет осиротевшие сетки и сохраняет индекс."""
+        files = self.index["files"]
+        if len(files) > self.max_entries:
+            stale = sorted(files, key=lambda path: files[path]["used"])[: len(files) - self.max_entries]
+            for path in stale:
+                del files[path]
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        alive = {entry["sha256"] for entry in files.values()}
+        for file in os.listdir(self.cache_dir):
+            digest, ext = os.path.splitext(file)
+            if ext == ".json" and file != INDEX_FILE and digest not in alive:
+                os.remove(os.path.join(self.cache_dir, file))
+        write_json_atomic(self.index_path, self.index)
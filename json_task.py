@@ -1,13 +1,47 @@
+import argparse
+import csv
 import json
 import os
+import re
+import sqlite3
+import uuid
+from bisect import bisect_right
+from collections.abc import Iterable, Iterator, Mapping
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font
 from openpyxl.styles.borders import Border, Side
 from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.worksheet import Worksheet
 
 import logger as lg
+import metrics
+from json_cache import GridCache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+THIN_BORDER = Border(
+    left=Side(style="thin"), right=Side(style="thin"), top=Side(style="thin"), bottom=Side(style="thin")
+)
+HEADER_FONT = Font(bold=True)
+STREAM_CHUNK_SIZE = 1 << 16
+NUMERIC_SAMPLE_SIZE = 100
+ORJSON_MAX_SIZE = 64 << 20
+NUMBER_FORMAT = "#,##0"
+SHEET_NAME_MAX_LENGTH = 31
+INVALID_SHEET_NAME_CHARS = re.compile(r"[\\*?:/\[\]]")
+SAP_NUMBER = re.compile(r"[+-]?\s*(?:\d{1,3}(?:[ \u00a0.]\d{3})+|\d+)(?:,\d+)?\s*-?")
+_NUMBER_TRANSLATION = str.maketrans({" ": None, "\u00a0": None, ".": None, ",": "."})
+STAGE_TIMER = "json_task_stage_seconds"
+FILES_COUNTER = "json_task_files_total"
+_WHITESPACE = " \t\n\r"
+_decoder = json.JSONDecoder()
 
 
 def find_shape_of_data(data: dict) -> int:
@@ -63,10 +97,19 @@ def fill_worksheet_values(start: int, data: tuple[dict], field: str, ws: Workshe
     :param ws: рабочий лист
     """
     for i in range(0, len(data)):
-        value = data[i][field]
-        if isinstance(value, str) and value[-1] == "-":
-            value = "-" + value[: (len(value) - 1)]
-        ws.cell(row=i // start + 2, column=i % start + 1, value=value)
+        ws.cell(row=i // start + 2, column=i % start + 1, value=fix_trailing_minus(data[i][field]))
+
+
+def fix_trailing_minus(value):
+    """
+    Переносит знак минуса в начало числа в формате SAP ("123,45-" -> "-123,45").
+
+    :param value: значение ячейки
+    :returns: исправленное значение
+    """
+    if isinstance(value, str) and value.endswith("-"):
+        return "-" + value[:-1]
+    return value
 
 
 def add_borders_to_cells(ws: Worksheet) -> None:
@@ -75,12 +118,197 @@ def add_borders_to_cells(ws: Worksheet) -> None:
 
     :param ws: рабочий лист
     """
-    thin_border = Border(
-        left=Side(style="thin"), right=Side(style="thin"), top=Side(style="thin"), bottom=Side(style="thin")
-    )
     for col in ws.iter_cols():
         for cell in col:
-            cell.border = thin_border
+            cell.border = THIN_BORDER
+
+
+class Element:
+    """Компактная запись элемента экрана SAP GUI: только координаты, текст и всплывающая подсказка."""
+
+    __slots__ = ("x", "y", "text", "quick_info")
+
+    def __init__(self, x: int, y: int, text: str, quick_info: str = ""):
+        self.x = x
+        self.y = y
+        self.text = text
+        self.quick_info = quick_info
+
+    @classmethod
+    def from_properties(cls, properties: Mapping) -> "Element":
+        """
+        Создаёт запись из словаря properties, отбрасывая неиспользуемые поля.
+
+        :param properties: словарь properties элемента
+        :returns: запись элемента
+        """
+        return cls(int(properties["X"]), int(properties["Y"]), properties["Text"], properties.get("QuickInfo", ""))
+
+
+def load_elements(file: str, backend: str = None) -> tuple[list[Element], list[Element]]:
+    """
+    Читает json файл в компактные записи, сохраняя из элементов только X, Y, Text и QuickInfo.
+
+    Бэкенд "json" разбирает файл потоково через iter_json_elements и проецирует каждый элемент сразу,
+    поэтому в памяти живут только компактные записи: на большом дампе пик около 60 МБ против ~1,3 ГБ
+    у json.load, но разбор примерно на треть медленнее. Бэкенд "orjson" читает и разбирает файл целиком,
+    поэтому по памяти не выигрывает, а по времени быстрее json.load лишь на единицы процентов.
+    По умолчанию orjson (если установлен) берётся для файлов до ORJSON_MAX_SIZE, а более крупные
+    читаются потоково.
+
+    :param file: путь к json файлу
+    :param backend: "orjson" или "json", по умолчанию выбирается по размеру файла
+    :returns: элементы заголовка и элементы значений
+    """
+    if backend is None:
+        backend = "orjson" if orjson is not None and os.path.getsize(file) <= ORJSON_MAX_SIZE else "json"
+    headers = []
+    values = []
+    if backend == "orjson":
+        with open(file, "rb") as f:
+            data = orjson.loads(f.read())
+        if not isinstance(data, dict):
+            raise ValueError(f"Ожидался json объект, а не {type(data).__name__}")
+        for section in data:
+            target = headers if section == "headers" else values
+            target.extend(Element.from_properties(elem["properties"]) for elem in data[section])
+    else:
+        for section, properties in iter_json_elements(file):
+            (headers if section == "headers" else values).append(Element.from_properties(properties))
+    return headers, values
+
+
+def build_grid(headers: list[Element], values: Iterable[Element]) -> tuple[list, list[list]]:
+    """
+    Раскладывает значения по сетке за один линейный проход без сортировки элементов.
+
+    Столбцы задаются X-координатами заголовков, строки - целыми Y значений. Значение, X которого не совпадает
+    с X заголовка, попадает в ближайший столбец слева. Пропущенные ячейки остаются None, совпавшие - склеиваются.
+
+    :param headers: элементы заголовка
+    :param values: элементы значений
+    :returns: заголовки столбцов и строки значений в порядке возрастания Y
+    """
+    headers = sorted(headers, key=lambda h: (h.y, h.x))
+    header = [h.quick_info for h in headers]
+    header_xs = [h.x for h in headers]
+    columns = {x: i for i, x in reversed(list(enumerate(header_xs)))}
+    ordered_xs = sorted(columns)
+    width = len(header)
+
+    buckets = {}
+    for elem in values:
+        x = elem.x
+        col = columns.get(x)
+        if col is None:
+            if not width:
+                continue
+            col = columns[ordered_xs[max(bisect_right(ordered_xs, x) - 1, 0)]]
+        y = elem.y
+        row = buckets.get(y)
+        if row is None:
+            row = buckets[y] = [None] * width
+        text = fix_trailing_minus(elem.text)
+        row[col] = text if row[col] is None else f"{row[col]} {text}"
+    return header, [buckets[y] for y in sorted(buckets)]
+
+
+def fill_worksheet_grid(header: list, rows: list[list], ws: Worksheet) -> None:
+    """
+    Заполняет рабочий лист сеткой: жирный заголовок с шириной столбцов и строки значений.
+
+    :param header: заголовки столбцов
+    :param rows: строки значений
+    :param ws: рабочий лист
+    """
+    for i, title in enumerate(header):
+        ws.cell(row=1, column=i + 1, value=title).font = Font(bold=True)
+        ws.column_dimensions[get_column_letter(i + 1)].width = int(len(str(title)) * 1.5)
+    for row in rows:
+        ws.append(row)
+
+
+def is_numeric_column(values: list, sample_size: int = NUMERIC_SAMPLE_SIZE) -> bool:
+    """
+    Определяет по выборке непустых значений, хранит ли столбец числа в формате SAP.
+
+    Столбец считается числовым, если все значения выборки - числа и хотя бы одно из них с десятичной запятой,
+    чтобы коды вида "1000" или "0001" оставались текстом.
+
+    :param values: значения столбца
+    :param sample_size: размер выборки
+    :returns: True, если столбец числовой
+    """
+    sample = [v.strip() for v in values if isinstance(v, str) and v.strip()][:sample_size]
+    return bool(sample) and all(SAP_NUMBER.fullmatch(v) for v in sample) and any("," in v for v in sample)
+
+
+def _parse_sap_number(value):
+    if not isinstance(value, str):
+        return value
+    text = value.strip()
+    if not SAP_NUMBER.fullmatch(text):
+        return value if text else None
+    if text.endswith("-"):
+        text = "-" + text[:-1]
+    return float(text.translate(_NUMBER_TRANSLATION))
+
+
+def parse_sap_numbers(values: list) -> list:
+    """
+    Переводит столбец чисел SAP ("- 4 200,00", "1.234,5-") в float.
+
+    Разделители тысяч (пробел, неразрывный пробел, точка) удаляются, десятичная запятая заменяется точкой,
+    минус в конце переносится в начало. Значения, не похожие на число, остаются как есть, пустые - None.
+
+    :param values: значения столбца
+    :returns: столбец с числами
+    """
+    return list(map(_parse_sap_number, values))
+
+
+def number_format(values: list) -> str:
+    """
+    Формат Excel для числового столбца с тем же числом знаков после запятой, что у самого точного значения SAP.
+
+    :param values: исходные строки столбца
+    :returns: формат вида "#,##0" или "#,##0.000"
+    """
+    decimals = max(
+        (len(v.strip().rstrip("-").rstrip().partition(",")[2]) for v in values if isinstance(v, str)), default=0
+    )
+    return f"{NUMBER_FORMAT}.{'0' * decimals}" if decimals else NUMBER_FORMAT
+
+
+def normalize_numeric_columns(
+    header: list, rows: list[list], sample_size: int = NUMERIC_SAMPLE_SIZE
+) -> tuple[list[list], list[str | None]]:
+    """
+    Переводит числовые столбцы сетки в float целиком, столбец за столбцом.
+
+    Столбец определяется числовым по выборке, но переводится, только если числами оказались все его значения:
+    иначе он остаётся текстовым, чтобы в одном столбце не смешивались числа и строки.
+
+    :param header: заголовки столбцов
+    :param rows: строки значений
+    :param sample_size: размер выборки для определения числовых столбцов
+    :returns: строки значений с числами в числовых столбцах и форматы чисел столбцов (None у текстовых)
+    """
+    formats = [None] * len(header)
+    if not rows:
+        return rows, formats
+    columns = [list(column) for column in zip(*rows)]
+    converted = False
+    for i in range(min(len(header), len(columns))):
+        if not is_numeric_column(columns[i], sample_size):
+            continue
+        parsed = parse_sap_numbers(columns[i])
+        if any(isinstance(value, str) for value in parsed):
+            continue
+        formats[i] = number_format(columns[i])
+        columns[i] = parsed
+        converted = True
+    return ([list(row) for row in zip(*columns)] if converted else rows), formats
 
 
 def create_and_fill_sheet(data: dict, wb: Workbook, sheet_name: str) -> None:
@@ -91,16 +319,549 @@ def create_and_fill_sheet(data: dict, wb: Workbook, sheet_name: str) -> None:
     :param wb: рабочая книга
     :param sheet_name: имя листа для сохранения
     """
+    with metrics.timer(STAGE_TIMER, stage="align"):
+        header, rows = prepare_sheet_data(data)
     ws = wb.create_sheet(sheet_name)
-    elements = align_data(data)
-    x = find_shape_of_data(data)
+    with metrics.timer(STAGE_TIMER, stage="fill"):
+        fill_worksheet_grid(header, rows, ws)
+    with metrics.timer(STAGE_TIMER, stage="borders"):
+        add_borders_to_cells(ws)
+
+
+class _StreamReader:
+    """Читает текстовый файл блоками и декодирует json-значения по мере поступления данных."""
+
+    def __init__(self, f, chunk_size: int = STREAM_CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _read_more(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+        return True
 
-    fill_worksheet_header(x, elements[:x], "QuickInfo", ws)
-    fill_worksheet_values(x, elements[x:], "Text", ws)
-    add_borders_to_cells(ws)
+    def peek(self) -> str:
+        """Пропускает пробельные символы и возвращает следующий значащий символ ("" в конце файла)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._read_more():
+                return self.buf[self.pos : self.pos + 1]
 
+    def expect(self, char: str) -> None:
+        """Проверяет, что следующий значащий символ равен char, и пропускает его."""
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Ожидался символ {char!r}", self.buf, self.pos)
+        self.pos += 1
 
-def convert_jsons_to_xlsx(files: list[str], name: str) -> None:
+    def decode(self):
+        """Декодирует очередное json-значение, дочитывая файл, пока значение не станет полным."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._read_more():
+                    raise
+                continue
+            # Число на границе блока может оказаться обрезанным, поэтому дочитываем файл.
+            if end == len(self.buf) and self._read_more():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_elements(file: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[tuple[str, dict]]:
+    """
+    Потоково разбирает json файл, не загружая его целиком в память.
+
+    Файл верхнего уровня должен быть объектом, значения-массивы ("headers", "values") разбираются поэлементно.
+
+    :param file: путь к json файлу
+    :param chunk_size: размер блока чтения в символах
+    :returns: итератор пар (имя секции, словарь properties элемента)
+    """
+    with open(file, encoding="utf-8") as f:
+        reader = _StreamReader(f, chunk_size)
+        reader.expect("{")
+        if reader.peek() == "}":
+            return
+        while True:
+            key = reader.decode()
+            reader.expect(":")
+            if reader.peek() == "[":
+                reader.expect("[")
+                if reader.peek() == "]":
+                    reader.expect("]")
+                else:
+                    while True:
+                        yield key, reader.decode()["properties"]
+                        if reader.peek() == "]":
+                            reader.expect("]")
+                            break
+                        reader.expect(",")
+            else:
+                reader.decode()
+            if reader.peek() == "}":
+                return
+            reader.expect(",")
+
+
+def collect_sheet_rows(file: str) -> tuple[list, list[list]]:
+    """
+    Потоково читает json файл и раскладывает значения по сетке через build_grid.
+
+    Значения проецируются в компактные записи Element и сразу попадают в сетку, поэтому в памяти держится
+    только сетка листа, а не все элементы. Сетка всё же собирается целиком: элементы дампа не упорядочены
+    по строкам, поэтому строку нельзя отдать раньше конца файла. Значения, которые в файле идут раньше
+    заголовков, приходится накопить до их конца.
+
+    :param file: путь к json файлу
+    :returns: заголовки столбцов и строки значений
+    :raises ValueError: если заголовки встретились после того, как значения уже пошли в сетку
+    """
+    stream = iter_json_elements(file)
+    headers = []
+    early = []
+    for section, properties in stream:
+        element = Element.from_properties(properties)
+        if section == "headers":
+            headers.append(element)
+            continue
+        early.append(element)
+        if headers:
+            break
+
+    def values() -> Iterator[Element]:
+        yield from early
+        for section, properties in stream:
+            if section == "headers":
+                raise ValueError("Заголовки после значений")
+            yield Element.from_properties(properties)
+
+    return build_grid(headers, values())
+
+
+def write_sheet_streaming(
+    wb: Workbook, sheet_name: str, header: list, rows: list[list], number_formats: list = None
+) -> None:
+    """
+    Записывает лист в write-only рабочую книгу построчно.
+
+    Шрифт заголовка, ширина столбцов и границы применяются к каждой строке в момент записи.
+
+    :param wb: рабочая книга в режиме write_only
+    :param sheet_name: имя листа
+    :param header: заголовки столбцов
+    :param rows: строки значений
+    :param number_formats: форматы чисел столбцов из normalize_numeric_columns, по умолчанию NUMBER_FORMAT
+    """
+    ws = wb.create_sheet(sheet_name)
+    for i, title in enumerate(header):
+        ws.column_dimensions[get_column_letter(i + 1)].width = int(len(str(title)) * 1.5)
+    width = len(header)
+    formats = list(number_formats or []) + [None] * width
+
+    def make_cell(value, font=None, number_format=None):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.border = THIN_BORDER
+        if font is not None:
+            cell.font = font
+        if isinstance(value, float):
+            cell.number_format = number_format or NUMBER_FORMAT
+        return cell
+
+    ws.append([make_cell(title, HEADER_FONT) for title in header])
+    for row in rows:
+        ws.append([make_cell(row[i] if i < len(row) else None, number_format=formats[i]) for i in range(width)])
+
+
+def unique_column_names(header: list) -> list[str]:
+    """
+    Формирует уникальные непустые имена столбцов для табличных форматов.
+
+    :param header: заголовки столбцов
+    :returns: имена столбцов: пустые заменяются на column_N, повторы получают суффикс _N. Повтором считаются
+        и имена, различающиеся только регистром, так как в SQLite имена столбцов регистронезависимы
+    """
+    names = []
+    seen = set()
+    for i, title in enumerate(header):
+        base = str(title).strip() if title not in (None, "") else f"column_{i + 1}"
+        column = base
+        n = 1
+        while column.casefold() in seen:
+            n += 1
+            column = f"{base}_{n}"
+        seen.add(column.casefold())
+        names.append(column)
+    return names
+
+
+def quote_identifier(name: str) -> str:
+    """Экранирует имя таблицы или столбца для SQL."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+@contextmanager
+def atomic_output(path: str):
+    """
+    Отдаёт временный путь рядом с path и после успешной записи атомарно подменяет им path через os.replace,
+    чтобы читатели никогда не видели недописанный файл. При ошибке временный файл удаляется.
+
+    :param path: путь к итоговому файлу
+    """
+    directory, base = os.path.split(path)
+    tmp = os.path.join(directory, f".{base}.{uuid.uuid4().hex}.tmp")
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class XlsxSheetWriter:
+    """Пишет листы в одну xlsx книгу через write-only режим openpyxl."""
+
+    suffix = ".xlsx"
+
+    def __init__(self, name: str):
+        self.path = f"{name}{self.suffix}"
+        self.sheets = 0
+        self.wb = Workbook(write_only=True)
+
+    def add_sheet(self, sheet_name: str, header: list, rows: list[list], number_formats: list = None) -> None:
+        write_sheet_streaming(self.wb, sheet_name, header, rows, number_formats)
+        self.sheets += 1
+
+    def close(self) -> None:
+        if self.sheets:
+            with atomic_output(self.path) as tmp:
+                self.wb.save(tmp)
+
+
+class CsvSheetWriter:
+    """Пишет каждый лист в отдельный csv файл в директории {name}_csv, первая строка - заголовки."""
+
+    suffix = "_csv"
+
+    def __init__(self, name: str):
+        self.path = f"{name}{self.suffix}"
+        self.sheets = 0
+
+    def add_sheet(self, sheet_name: str, header: list, rows: list[list], number_formats: list = None) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        with atomic_output(os.path.join(self.path, f"{sheet_name}.csv")) as tmp:
+            with open(tmp, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(header)
+                writer.writerows(rows)
+        self.sheets += 1
+
+    def close(self) -> None:
+        pass
+
+
+class ParquetSheetWriter:
+    """Пишет каждый лист в отдельный parquet файл в директории {name}_parquet. Требует pyarrow."""
+
+    suffix = "_parquet"
+
+    def __init__(self, name: str):
+        # pyarrow импортируется только здесь: его импорт заметно замедляет запуск, а нужен он лишь для parquet.
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("Для записи parquet требуется пакет pyarrow") from e
+        self.pyarrow = pyarrow
+        self.path = f"{name}{self.suffix}"
+        self.sheets = 0
+
+    def add_sheet(self, sheet_name: str, header: list, rows: list[list], number_formats: list = None) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        columns = {
+            column: [row[i] if i < len(row) else None for row in rows]
+            for i, column in enumerate(unique_column_names(header))
+        }
+        with atomic_output(os.path.join(self.path, f"{sheet_name}.parquet")) as tmp:
+            self.pyarrow.parquet.write_table(self.pyarrow.table(columns), tmp)
+        self.sheets += 1
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteSheetWriter:
+    """
+    Пишет каждый лист в отдельную таблицу файла {name}.sqlite, заголовки становятся именами столбцов.
+
+    Лист заменяется в одной транзакции, поэтому читатели базы видят либо старую, либо новую таблицу.
+    """
+
+    suffix = ".sqlite"
+
+    def __init__(self, name: str):
+        self.path = f"{name}{self.suffix}"
+        self.sheets = 0
+        self.connection = None
+
+    def add_sheet(self, sheet_name: str, header: list, rows: list[list], number_formats: list = None) -> None:
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path)
+        columns = unique_column_names(header)
+        table = quote_identifier(sheet_name)
+        with self.connection:
+            self.connection.execute(f"DROP TABLE IF EXISTS {table};")
+            if not columns:
+                lg.get_logger().info(f"Лист {sheet_name} без столбцов не записан в {self.path}")
+                return
+            self.connection.execute(f"CREATE TABLE {table} ({', '.join(map(quote_identifier, columns))});")
+            self.connection.executemany(
+                f"INSERT INTO {table} VALUES ({', '.join('?' * len(columns))});",
+                (row + [None] * (len(columns) - len(row)) for row in rows),
+            )
+        self.sheets += 1
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+
+
+WRITERS = {
+    "xlsx": XlsxSheetWriter,
+    "csv": CsvSheetWriter,
+    "parquet": ParquetSheetWriter,
+    "sqlite": SqliteSheetWriter,
+}
+
+
+def convert_jsons_to_xlsx_streaming(
+    files: list[str], name: str, output_format: str = "xlsx", typed_numbers: bool = False
+) -> None:
+    """
+    Потоковая версия convert_jsons_to_xlsx.
+
+    Json'ы разбираются поэлементно, а листы пишутся по одному сразу после разбора: для xlsx через write-only
+    рабочую книгу, поэтому в памяти не накапливаются объекты ячеек openpyxl. Каждый json заполняет новый лист.
+
+    :param files: список json файлов
+    :param name: имя итогового файла без расширения
+    :param output_format: формат вывода, один из ключей WRITERS
+    :param typed_numbers: записывать числовые столбцы числами, а не строками
+    """
+    logger = lg.get_logger()
+    writer = WRITERS[output_format](name)
+    sheet_names = unique_sheet_names(files)
+    try:
+        for file in files:
+            try:
+                with metrics.timer(STAGE_TIMER, stage="parse"):
+                    header, rows = collect_sheet_rows(file)
+            except Exception as e:
+                logger.info(f"Проверьте целостность файла {file}: {e!r}")
+                metrics.inc(FILES_COUNTER, status="failed")
+                continue
+            number_formats = None
+            if typed_numbers:
+                with metrics.timer(STAGE_TIMER, stage="normalize"):
+                    rows, number_formats = normalize_numeric_columns(header, rows)
+            with metrics.timer(STAGE_TIMER, stage="fill"):
+                writer.add_sheet(sheet_names[file], header, rows, number_formats)
+            metrics.inc(FILES_COUNTER, status="ok")
+    finally:
+        with metrics.timer(STAGE_TIMER, stage="save"):
+            writer.close()
+
+    if writer.sheets:
+        logger.info("Файл успешно сохранён")
+
+
+def get_sheet_name(file: str) -> str:
+    """
+    Формирует имя листа по имени json файла.
+
+    Символы, недопустимые в имени листа Excel, заменяются на "_", а имя обрезается до SHEET_NAME_MAX_LENGTH.
+
+    :param file: путь к json файлу
+    :returns: имя файла без директории и расширения
+    """
+    name = INVALID_SHEET_NAME_CHARS.sub("_", os.path.basename(file).split(".")[0])
+    return name[:SHEET_NAME_MAX_LENGTH].strip("'") or "Sheet"
+
+
+def unique_sheet_names(files: list[str]) -> dict[str, str]:
+    """
+    Формирует имена листов для файлов так, чтобы они не повторялись.
+
+    :param files: список json файлов
+    :returns: словарь файл -> имя листа. Повторы получают суффикс _N, повтором считаются и имена,
+        различающиеся только регистром, так как Excel и SQLite их не различают
+    """
+    names = {}
+    seen = set()
+    for file in files:
+        base = name = get_sheet_name(file)
+        n = 1
+        while name.casefold() in seen:
+            n += 1
+            suffix = f"_{n}"
+            name = base[: SHEET_NAME_MAX_LENGTH - len(suffix)] + suffix
+        seen.add(name.casefold())
+        names[file] = name
+    return names
+
+
+def prepare_sheet_data(data: dict) -> tuple[list, list[list]]:
+    """
+    Выравнивает данные json'а в сетку: заголовки столбцов и строки значений.
+
+    Результат не зависит от рабочего листа, поэтому его можно передавать между процессами.
+
+    :param data: словарь полученный из json
+    :returns: заголовки столбцов и строки значений
+    """
+    headers = [Element.from_properties(elem["properties"]) for elem in data["headers"]]
+    values = (
+        Element.from_properties(elem["properties"])
+        for section in data
+        if section != "headers"
+        for elem in data[section]
+    )
+    return build_grid(headers, values)
+
+
+def load_sheet_data(file: str) -> tuple[list, list[list]]:
+    """
+    Читает json файл и выравнивает его данные в сетку. Выполняется в процессе пула.
+
+    :param file: путь к json файлу
+    :returns: заголовки столбцов и строки значений
+    """
+    return build_grid(*load_elements(file))
+
+
+def convert_jsons_to_xlsx_parallel(
+    files: list[str],
+    name: str,
+    workers: int = None,
+    cache: GridCache = None,
+    output_format: str = "xlsx",
+    typed_numbers: bool = False,
+) -> list[tuple[str, str]]:
+    """
+    Пакетная версия convert_jsons_to_xlsx.
+
+    Json'ы разбираются и выравниваются в пуле процессов, затем результаты сливаются в одну рабочую книгу.
+    Листы идут в порядке переданных файлов, ошибка в одном файле не останавливает обработку остальных.
+    С кешем разбираются только изменившиеся файлы, а если не изменился ни один, книга не пересобирается.
+
+    :param files: список json файлов
+    :param name: имя итогового файла без расширения
+    :param workers: число процессов, по умолчанию число ядер; при 1 файлы разбираются в текущем процессе
+    :param cache: кеш выровненных сеток
+    :param output_format: формат вывода, один из ключей WRITERS
+    :param typed_numbers: записывать числовые столбцы числами, а не строками
+    :returns: список пар (файл, описание ошибки) для файлов, которые не удалось обработать
+    """
+    logger = lg.get_logger()
+    failed = []
+    if not files:
+        return failed
+
+    grids = {}
+    digests = {}
+    if cache is not None:
+        for file in files:
+            try:
+                grid, digests[file] = cache.lookup(file)
+            except OSError:
+                continue
+            if grid is not None:
+                grids[file] = grid
+    misses = [file for file in files if file not in grids]
+
+    results = {}
+    metrics.inc(FILES_COUNTER, len(grids), status="cached")
+    with metrics.timer(STAGE_TIMER, stage="parse"):
+        if workers == 1:
+            for file in misses:
+                try:
+                    results[file] = load_sheet_data(file)
+                except Exception as e:
+                    results[file] = e
+        elif misses:
+            with ProcessPoolExecutor(max_workers=workers, initializer=lg.init_worker) as executor:
+                futures = [executor.submit(load_sheet_data, file) for file in misses]
+                for file, future in zip(misses, futures):
+                    # Упавший процесс пула даёт BrokenProcessPool: файл тоже считается необработанным.
+                    try:
+                        results[file] = future.result()
+                    except Exception as e:
+                        results[file] = e
+
+    for file, result in results.items():
+        if isinstance(result, Exception):
+            logger.info(f"Проверьте целостность файла {file}: {result!r}")
+            metrics.inc(FILES_COUNTER, status="failed")
+            failed.append((file, repr(result)))
+        else:
+            metrics.inc(FILES_COUNTER, status="ok")
+            grids[file] = result
+            if file in digests:
+                cache.store(file, digests[file], result)
+
+    writer = WRITERS[output_format](name)
+    done = [file for file in files if file in grids]
+    if cache is not None:
+        used_digests = [digests[file] for file in done]
+        options = {"format": output_format, "typed_numbers": typed_numbers}
+        if not misses and cache.is_output_fresh(writer.path, used_digests, options):
+            logger.info("Исходные файлы и настройки не изменились")
+            cache.save()
+            return failed
+        cache.set_output(writer.path, used_digests, options)
+
+    sheet_names = unique_sheet_names(done)
+    try:
+        for file in done:
+            header, rows = grids[file]
+            number_formats = None
+            if typed_numbers:
+                with metrics.timer(STAGE_TIMER, stage="normalize"):
+                    rows, number_formats = normalize_numeric_columns(header, rows)
+            with metrics.timer(STAGE_TIMER, stage="fill"):
+                writer.add_sheet(sheet_names[file], header, rows, number_formats)
+    finally:
+        with metrics.timer(STAGE_TIMER, stage="save"):
+            writer.close()
+    if writer.sheets:
+        logger.info("Файл успешно сохранён")
+    if cache is not None:
+        cache.save()
+    return failed
+
+
+def convert_jsons_to_xlsx(
+    files: list[str],
+    name: str,
+    streaming: bool = False,
+    workers: int = None,
+    cache: GridCache = None,
+    output_format: str = "xlsx",
+    typed_numbers: bool = False,
+) -> None:
     """
     Основная функция запуска.
 
@@ -108,24 +869,70 @@ def convert_jsons_to_xlsx(files: list[str], name: str) -> None:
     Каждый json заполняет новый лист.
 
     :param files: словарий значений
+    :param name: имя итогового xlsx файла без расширения
+    :param streaming: использовать потоковый разбор и write-only запись
+    :param workers: число процессов для пакетной обработки, 0 - по числу ядер
+    :param cache: кеш выровненных сеток, переиспользуемый между запусками
+    :param output_format: формат вывода: xlsx, csv, parquet или sqlite
+    :param typed_numbers: записывать числовые столбцы числами, а не строками
     """
+    if streaming:
+        convert_jsons_to_xlsx_streaming(files, name, output_format, typed_numbers)
+        return
+    if workers is not None or cache is not None or output_format != "xlsx" or typed_numbers:
+        workers = 1 if workers is None else workers or None
+        convert_jsons_to_xlsx_parallel(files, name, workers, cache, output_format, typed_numbers)
+        return
     if files:
+        wb = Workbook()
+        del wb["Sheet"]
+        logger = lg.get_logger()
+        sheet_names = unique_sheet_names(files)
         for file in files:
+            sheets = len(wb.worksheets)
             try:
-                wb = Workbook()
-                logger = lg.get_logger()
-                with open(file, encoding="utf-8") as f:
+                with open(file, encoding="utf-8") as f, metrics.timer(STAGE_TIMER, stage="parse"):
                     data = json.load(f)
-                    sheet_name = file.split(".")[0]
-                    create_and_fill_sheet(data, wb, sheet_name)
+                create_and_fill_sheet(data, wb, sheet_names[file])
+                metrics.inc(FILES_COUNTER, status="ok")
+            except Exception as e:
+                if len(wb.worksheets) > sheets:
+                    wb.remove(wb.worksheets[-1])
+                logger.info(f"Проверьте целостность файла {file}: {e!r}")
+                metrics.inc(FILES_COUNTER, status="failed")
+
+        if wb.worksheets:
+            with metrics.timer(STAGE_TIMER, stage="save"), atomic_output(f"{name}.xlsx") as tmp:
+                wb.save(tmp)
+            logger.info("Файл успешно сохранён")
 
-                del wb["Sheet"]
-                wb.save(f"{name}.xlsx")
-                logger.info("Файл успешно сохранён")
-            except KeyError:
-                logger.info(f"Проверьте целостность файла {file}")
+
+def get_cmd_args() -> argparse.Namespace:
+    """Парсер аргументов командной строки."""
+    parser = argparse.ArgumentParser(prog="Конвертер json в xlsx")
+    parser.add_argument("--streaming", action="store_true", help="Потоковый разбор json и запись xlsx")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="xlsx", help="Формат итогового файла")
+    parser.add_argument("--typed-numbers", action="store_true", help="Записывать числовые столбцы числами")
+    parser.add_argument("--no-cache", action="store_true", help="Не использовать кеш выровненных сеток")
+    parser.add_argument("--rebuild", action="store_true", help="Пересобрать кеш и итоговый файл заново")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Пакетная обработка в пуле процессов, 0 - по числу ядер"
+    )
+    metrics.add_cli_arguments(parser)
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    files = [file for file in os.listdir(".") if file.endswith(".json")]
-    convert_jsons_to_xlsx(files, "MyFile")
+    args = get_cmd_args()
+    files = sorted(file for file in os.listdir(".") if file.endswith(".json"))
+    cache = None if args.no_cache or args.streaming else GridCache(rebuild=args.rebuild)
+    with metrics.cli_session(args):
+        convert_jsons_to_xlsx(
+            files,
+            "MyFile",
+            streaming=args.streaming,
+            workers=args.workers,
+            cache=cache,
+            output_format=args.format,
+            typed_numbers=args.typed_numbers,
+        )
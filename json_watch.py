@@ -0,0 +1,364 @@
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import json_task as jt
+import logger as lg
+
+QUIET_PERIOD = 2.0
+POLL_INTERVAL = 1.0
+WORKERS = 2
+PATTERN_SUFFIX = ".json"
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_INOTIFY_EVENT = struct.Struct("iIII")
+_INOTIFY_BUFFER = 1 << 16
+
+
+def is_dump(name: str) -> bool:
+    """Проверяет, что имя файла - json дамп, а не скрытый или временный файл."""
+    return name.endswith(PATTERN_SUFFIX) and not name.startswith(".")
+
+
+def file_signature(path: str) -> tuple[int, int] | None:
+    """
+    Подпись состояния файла для обнаружения изменений.
+
+    :param path: путь к файлу
+    :returns: пара (mtime в наносекундах, размер) или None, если файла нет
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def list_dumps(directory: str) -> list[str]:
+    """Возвращает отсортированные пути json дампов в директории."""
+    with os.scandir(directory) as entries:
+        return sorted(entry.path for entry in entries if entry.is_file() and is_dump(entry.name))
+
+
+class PollingWatcher:
+    """Обнаруживает новые и изменённые дампы, периодически сравнивая mtime и размер файлов директории."""
+
+    def __init__(self, directory: str, interval: float = POLL_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self._signatures = {path: file_signature(path) for path in list_dumps(directory)}
+
+    def poll(self, timeout: float) -> list[str]:
+        """
+        Ждёт не дольше timeout и возвращает дампы, изменившиеся с прошлого вызова.
+
+        :param timeout: максимальное время ожидания в секундах
+        :returns: пути изменившихся файлов
+        """
+        time.sleep(min(timeout, self.interval))
+        changed = []
+        signatures = {}
+        for path in list_dumps(self.directory):
+            signatures[path] = file_signature(path)
+            if self._signatures.get(path) != signatures[path]:
+                changed.append(path)
+        self._signatures = signatures
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """Получает события о дампах директории от inotify через ctypes, без сторонних пакетов. Только Linux."""
+
+    def __init__(self, directory: str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify недоступен")
+        self.directory = directory
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch", directory)
+
+    def poll(self, timeout: float) -> list[str]:
+        """
+        Ждёт событий не дольше timeout и возвращает пути дампов, к которым они относятся.
+
+        При переполнении очереди событий (IN_Q_OVERFLOW) возвращает все дампы директории.
+
+        :param timeout: максимальное время ожидания в секундах
+        :returns: пути изменившихся файлов без повторов
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, _INOTIFY_BUFFER)
+        except BlockingIOError:
+            return []
+        changed = {}
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Очередь ядра переполнилась и события потеряны: перечитываем директорию целиком.
+                changed.update(dict.fromkeys(list_dumps(self.directory)))
+            elif is_dump(name):
+                changed[os.path.join(self.directory, name)] = None
+        return list(changed)
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def create_watcher(directory: str, interval: float = POLL_INTERVAL, polling: bool = False):
+    """
+    Создаёт наблюдатель за директорией: inotify, если он доступен, иначе опрос.
+
+    :param directory: директория с дампами
+    :param interval: период опроса для PollingWatcher
+    :param polling: всегда использовать опрос, например для сетевых дисков, где inotify не работает
+    :returns: InotifyWatcher или PollingWatcher
+    """
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directory)
+        except OSError as e:
+            lg.get_logger().info(f"inotify недоступен ({e}), используется опрос директории")
+    return PollingWatcher(directory, interval)
+
+
+class Debouncer:
+    """
+    Откладывает обработку файла, пока он не перестанет меняться в течение quiet_period секунд.
+
+    Так недописанный дамп не уходит в конвертацию: каждое новое событие или изменение размера и mtime
+    к моменту проверки сдвигает срок ещё на quiet_period.
+    """
+
+    def __init__(self, quiet_period: float = QUIET_PERIOD):
+        self.quiet_period = quiet_period
+        self._pending = {}
+
+    def touch(self, path: str, now: float = None) -> None:
+        """Отмечает событие по файлу."""
+        now = time.monotonic() if now is None else now
+        self._pending[path] = (now + self.quiet_period, file_signature(path))
+
+    def ready(self, now: float = None) -> list[str]:
+        """
+        Забирает файлы, которые не менялись quiet_period секунд. Исчезнувшие файлы отбрасываются.
+
+        :param now: текущее время по time.monotonic
+        :returns: пути готовых файлов
+        """
+        now = time.monotonic() if now is None else now
+        ready = []
+        for path, (deadline, signature) in list(self._pending.items()):
+            if now < deadline:
+                continue
+            current = file_signature(path)
+            if current is None:
+                del self._pending[path]
+            elif current != signature:
+                self._pending[path] = (now + self.quiet_period, current)
+            else:
+                del self._pending[path]
+                ready.append(path)
+        return ready
+
+
+def output_name(file: str, output_dir: str) -> str:
+    """Имя итогового файла без расширения: имя дампа в директории output_dir."""
+    return os.path.join(output_dir, os.path.basename(file).split(".")[0])
+
+
+def is_output_fresh(file: str, output_dir: str, output_format: str) -> bool:
+    """Проверяет, что итоговый файл дампа уже есть и записан не раньше последнего изменения дампа."""
+    output = file_signature(output_name(file, output_dir) + jt.WRITERS[output_format].suffix)
+    source = file_signature(file)
+    return output is not None and source is not None and output[0] >= source[0]
+
+
+def convert_file(file: str, output_dir: str, output_format: str = "xlsx", typed_numbers: bool = False) -> list:
+    """
+    Конвертирует один дамп в свой итоговый файл в output_dir. Выполняется в пуле WatchDaemon.
+
+    :param file: путь к json дампу
+    :param output_dir: директория итоговых файлов
+    :param output_format: формат вывода, один из ключей jt.WRITERS
+    :param typed_numbers: записывать числовые столбцы числами
+    :returns: список пар (файл, описание ошибки), пустой при успехе
+    """
+    name = output_name(file, output_dir)
+    return jt.convert_jsons_to_xlsx_parallel([file], name, 1, output_format=output_format, typed_numbers=typed_numbers)
+
+
+class WatchDaemon:
+    """
+    Следит за директорией и конвертирует новые и изменённые json дампы, каждый в свой итоговый файл.
+
+    Файл отправляется в пул после паузы в записи (Debouncer) и только если он изменился с прошлой
+    конвертации; после перезапуска сравнивается mtime дампа и его итогового файла, поэтому уже
+    сконвертированные дампы не обрабатываются повторно. В работе не больше 2 * workers файлов; файл,
+    изменившийся во время конвертации, конвертируется ещё раз после неё. Итоговые файлы пишутся атомарно
+    (jt.atomic_output).
+    """
+
+    def __init__(
+        self,
+        directory: str = ".",
+        output_dir: str = None,
+        workers: int = WORKERS,
+        output_format: str = "xlsx",
+        typed_numbers: bool = False,
+        quiet_period: float = QUIET_PERIOD,
+        interval: float = POLL_INTERVAL,
+        polling: bool = False,
+    ):
+        """
+        :param directory: директория с дампами
+        :param output_dir: директория итоговых файлов, по умолчанию directory
+        :param workers: число процессов конвертации; при 1 конвертация идёт в фоновом потоке текущего процесса
+        :param output_format: формат вывода, один из ключей jt.WRITERS
+        :param typed_numbers: записывать числовые столбцы числами
+        :param quiet_period: сколько секунд файл не должен меняться перед конвертацией
+        :param interval: период опроса, если inotify недоступен
+        :param polling: не использовать inotify
+        """
+        self.directory = directory
+        self.output_dir = output_dir or directory
+        self.workers = workers
+        self.output_format = output_format
+        self.typed_numbers = typed_numbers
+        self.interval = interval
+        self.polling = polling
+        self.debouncer = Debouncer(quiet_period)
+        self.converted = 0
+        self.failed = 0
+        self._running = {}
+        self._converted = {}
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        """Просит цикл run завершиться после текущей итерации."""
+        self._stop.set()
+
+    def _collect(self) -> None:
+        logger = lg.get_logger()
+        for file, (signature, future) in list(self._running.items()):
+            if not future.done():
+                continue
+            del self._running[file]
+            self._converted[file] = signature
+            try:
+                failures = future.result()
+            except Exception as e:
+                failures = [(file, repr(e))]
+            if failures:
+                self.failed += 1
+                logger.info(f"Не удалось сконвертировать {file}: {failures[0][1]}")
+            else:
+                self.converted += 1
+                logger.info(f"Сконвертирован {file}")
+
+    def _schedule(self, executor, now: float) -> None:
+        for file in self.debouncer.ready(now):
+            if file in self._running or len(self._running) >= 2 * self.workers:
+                self.debouncer.touch(file, now)
+                continue
+            signature = file_signature(file)
+            if file in self._converted:
+                if self._converted[file] == signature:
+                    continue
+            elif is_output_fresh(file, self.output_dir, self.output_format):
+                continue
+            future = executor.submit(convert_file, file, self.output_dir, self.output_format, self.typed_numbers)
+            self._running[file] = (signature, future)
+
+    def run(self, timeout: float = None) -> None:
+        """
+        Запускает цикл наблюдения до вызова stop или истечения timeout секунд.
+
+        :param timeout: ограничение времени работы, по умолчанию без ограничения
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        watcher = create_watcher(self.directory, self.interval, self.polling)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        executor = (
+            ThreadPoolExecutor(max_workers=1)
+            if self.workers == 1
+            else ProcessPoolExecutor(self.workers, initializer=lg.init_worker)
+        )
+        lg.get_logger().info(f"Наблюдение за {os.path.abspath(self.directory)} ({type(watcher).__name__})")
+        try:
+            # Дампы, не менявшиеся дольше паузы, готовы сразу, а остальные (возможно, ещё дописываемые)
+            # ждут паузы в записи, как при обычном событии.
+            start, wall_clock = time.monotonic(), time.time_ns()
+            for file in list_dumps(self.directory):
+                signature = file_signature(file)
+                idle = signature is not None and wall_clock - signature[0] >= self.debouncer.quiet_period * 1e9
+                self.debouncer.touch(file, start - self.debouncer.quiet_period if idle else start)
+            while not self._stop.is_set() and (deadline is None or time.monotonic() < deadline):
+                for file in watcher.poll(self.interval):
+                    self.debouncer.touch(file)
+                self._collect()
+                self._schedule(executor, time.monotonic())
+        finally:
+            watcher.close()
+            executor.shutdown(wait=True)
+            self._collect()
+
+
+def get_cmd_args() -> argparse.Namespace:
+    """Парсер аргументов командной строки."""
+    parser = argparse.ArgumentParser(prog="Наблюдение за json дампами")
+    parser.add_argument("directory", nargs="?", default=".", help="Директория с json дампами")
+    parser.add_argument("--output-dir", help="Директория итоговых файлов, по умолчанию директория дампов")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Число процессов конвертации")
+    parser.add_argument("--format", choices=sorted(jt.WRITERS), default="xlsx", help="Формат итоговых файлов")
+    parser.add_argument("--typed-numbers", action="store_true", help="Записывать числовые столбцы числами")
+    parser.add_argument(
+        "--quiet-period", type=float, default=QUIET_PERIOD, help="Сколько секунд файл не должен меняться"
+    )
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="Период опроса без inotify")
+    parser.add_argument("--polling", action="store_true", help="Не использовать inotify")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_cmd_args()
+    daemon = WatchDaemon(
+        args.directory,
+        args.output_dir,
+        args.workers,
+        args.format,
+        args.typed_numbers,
+        args.quiet_period,
+        args.interval,
+        args.polling,
+    )
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        lg.get_logger().info(f"Наблюдение остановлено, сконвертировано файлов: {daemon.converted}")
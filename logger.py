@@ -1,37 +1,170 @@
-import datetime
+import atexit
 import logging
-import logging.config
 import os
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler, WatchedFileHandler
 
 logs_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), "logs")
-if not os.path.exists(logs_dir):
-    os.makedirs(logs_dir)
+LOG_FILE = "pikta.log"
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-LOG_CONFIG = {
-    "version": 1,
-    "handlers": {
-        "file": {
-            "level": "INFO",
-            "formatter": "myFormatter",
-            "class": "logging.FileHandler",
-            "filename": f"{os.path.join(logs_dir,datetime.datetime.now().strftime('%Y%m%d.log'))}",
-        },
-        "console": {
-            "level": "INFO",
-            "formatter": "myFormatter",
-            "class": "logging.StreamHandler",
-            "stream": "ext://sys.stdout",
-        },
-    },
-    "loggers": {
-        "": {"handlers": ["file", "console"], "level": "INFO", "propagate": False},
-    },
-    "formatters": {"myFormatter": {"format": LOG_FORMAT}},
-}
-logging.config.dictConfig(LOG_CONFIG)
-logging.basicConfig(level=logging.INFO)
+LOG_BACKUP_COUNT = 30
+QUEUE_SIZE = 10000
+OVERFLOW_POLICIES = ("block", "drop", "drop_oldest")
+OVERFLOW_POLICY = "drop"
+
+_listener = None
+_configured = False
+_settings = {}
+_configure_lock = threading.Lock()
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Обработчик, который только кладёт запись в ограниченную очередь.
+
+    При переполнении поступает согласно overflow: "block" ждёт места в очереди, "drop" отбрасывает
+    новую запись, "drop_oldest" вытесняет самую старую. Число потерянных записей хранится в dropped.
+    """
+
+    def __init__(self, log_queue: queue.Queue, overflow: str = OVERFLOW_POLICY):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Неизвестная политика переполнения: {overflow}")
+        super().__init__(log_queue)
+        self.overflow = overflow
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.overflow == "block":
+            self.queue.put(record)
+            return
+        while True:
+            try:
+                self.queue.put_nowait(record)
+                return
+            except queue.Full:
+                self.dropped += 1
+                if self.overflow == "drop":
+                    return
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+
+
+class _BlockingSentinelListener(QueueListener):
+    """Слушатель, который при остановке ждёт места под маркер конца, а не падает на полной очереди."""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+
+def setup_logging(
+    level: int | str = None,
+    console: bool = None,
+    queue_size: int = QUEUE_SIZE,
+    overflow: str = OVERFLOW_POLICY,
+    log_dir: str = None,
+) -> QueueListener:
+    """
+    Настраивает корневой логгер: записи через ограниченную очередь передаются фоновому потоку,
+    который пишет их в файл с ежесуточной ротацией и, если нужно, в консоль.
+
+    Вызывать не обязательно: get_logger настраивает логирование при первом обращении. Не заданные
+    параметры берутся из переменных окружения PIKTA_LOG_LEVEL, PIKTA_LOG_CONSOLE и PIKTA_LOG_DIR.
+    Повторный вызов останавливает прежний слушатель, дописав накопленные записи.
+
+    :param level: уровень логирования, по умолчанию INFO
+    :param console: дублировать ли записи в stdout, по умолчанию да
+    :param queue_size: размер очереди записей
+    :param overflow: политика переполнения очереди, см. BoundedQueueHandler
+    :param log_dir: каталог файлов логов, по умолчанию папка logs рядом с модулем
+    :returns: запущенный слушатель очереди
+    """
+    global _listener, _configured
+    shutdown()
+    _settings.update(_resolve_settings(level, console, log_dir))
+    file_handler = TimedRotatingFileHandler(
+        os.path.join(_settings["log_dir"], LOG_FILE),
+        when="midnight",
+        backupCount=LOG_BACKUP_COUNT,
+        encoding="utf-8",
+        delay=True,
+    )
+    handlers = _prepare_handlers(file_handler, **_settings)
+    log_queue = queue.Queue(queue_size)
+    root = logging.getLogger()
+    for handler in [h for h in root.handlers if isinstance(h, BoundedQueueHandler)]:
+        root.removeHandler(handler)
+    root.addHandler(BoundedQueueHandler(log_queue, overflow))
+    root.setLevel(_settings["level"])
+    _listener = _BlockingSentinelListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    _configured = True
+    return _listener
+
+
+def _resolve_settings(level: int | str = None, console: bool = None, log_dir: str = None) -> dict:
+    return {
+        "level": level or os.environ.get("PIKTA_LOG_LEVEL", "INFO").upper(),
+        "console": os.environ.get("PIKTA_LOG_CONSOLE", "1") != "0" if console is None else console,
+        "log_dir": log_dir or os.environ.get("PIKTA_LOG_DIR", logs_dir),
+    }
+
+
+def _prepare_handlers(file_handler: logging.Handler, level: int | str, console: bool, log_dir: str) -> list:
+    os.makedirs(log_dir, exist_ok=True)
+    handlers = [file_handler]
+    if console:
+        handlers.append(logging.StreamHandler(sys.stdout))
+    formatter = logging.Formatter(LOG_FORMAT)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        handler.setLevel(level)
+    return handlers
+
+
+def init_worker() -> None:
+    """
+    Настраивает логирование в дочернем процессе пула: передаётся как initializer в ProcessPoolExecutor.
+
+    Процесс, созданный через fork, наследует обработчик очереди, но не фоновый поток, который её разбирает,
+    поэтому без этого его записи терялись бы. Дочерний процесс пишет в тот же файл напрямую, без очереди:
+    процесс пула завершается, минуя atexit, и недописанная очередь пропала бы. Настройки берутся те же,
+    что у родителя; ротирует файл только родитель, а WatchedFileHandler после ротации переоткрывает файл.
+    """
+    global _listener, _configured
+    _listener = None
+    settings = _settings or _resolve_settings()
+    file_handler = WatchedFileHandler(os.path.join(settings["log_dir"], LOG_FILE), encoding="utf-8", delay=True)
+    root = logging.getLogger()
+    for handler in [h for h in root.handlers if isinstance(h, BoundedQueueHandler)]:
+        root.removeHandler(handler)
+    for handler in _prepare_handlers(file_handler, **settings):
+        root.addHandler(handler)
+    root.setLevel(settings["level"])
+    _configured = True
+
+
+def shutdown() -> None:
+    """Дописывает записи из очереди, останавливает фоновый поток и закрывает файлы логов."""
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
 
 
 def get_logger() -> logging.Logger:
-    """Возвращает настроенный логгер."""
+    """Возвращает корневой логгер, при первом вызове настраивая логирование через setup_logging."""
+    if not _configured:
+        with _configure_lock:
+            if not _configured:
+                setup_logging()
     return logging.getLogger()
+
+
+atexit.register(shutdown)
@@ -0,0 +1,249 @@
+import argparse
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+
+import logger as lg
+
+PROFILERS = ("cprofile", "tracemalloc")
+PROFILE_TOP = 20
+
+
+class _NullTimer:
+    """Таймер-заглушка для выключенных метрик: вход и выход ничего не делают."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("registry", "name", "labels", "start")
+
+    def __init__(self, registry: "Registry", name: str, labels: tuple):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry._observe(self.name, time.perf_counter() - self.start, self.labels)
+        return False
+
+
+class Registry:
+    """
+    Потокобезопасное хранилище счётчиков и таймеров.
+
+    Пока реестр выключен, inc, observe и timer возвращаются сразу, не трогая блокировку.
+    Метки метрики хранятся кортежем пар (имя, значение), отсортированным по имени.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.counters = {}
+        self.timers = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """Увеличивает счётчик name с метками labels на value."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        """Добавляет замер длительности в таймер name с метками labels: число замеров, сумму и максимум."""
+        if not self.enabled:
+            return
+        self._observe(name, seconds, tuple(sorted(labels.items())))
+
+    def _observe(self, name: str, seconds: float, labels: tuple) -> None:
+        key = (name, labels)
+        with self._lock:
+            count, total, peak = self.timers.get(key, (0, 0.0, 0.0))
+            self.timers[key] = (count + 1, total + seconds, max(peak, seconds))
+
+    def timer(self, name: str, **labels):
+        """Контекстный менеджер, замеряющий длительность блока в таймер name."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, tuple(sorted(labels.items())))
+
+    def reset(self) -> None:
+        """Сбрасывает накопленные значения."""
+        with self._lock:
+            self.counters.clear()
+            self.timers.clear()
+
+    def snapshot(self) -> dict:
+        """
+        Снимок метрик для сериализации в json.
+
+        :returns: словарь {"counters": [...], "timers": [...]} с именем, метками и значениями каждой метрики
+        """
+        with self._lock:
+            counters = sorted(self.counters.items())
+            timers = sorted(self.timers.items())
+        return {
+            "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in counters],
+            "timers": [
+                {"name": name, "labels": dict(labels), "count": count, "sum": total, "max": peak}
+                for (name, labels), (count, total, peak) in timers
+            ],
+        }
+
+    def prometheus_text(self) -> str:
+        """Метрики в текстовом формате Prometheus: счётчики как counter, таймеры как summary с _count и _sum."""
+        snapshot = self.snapshot()
+        lines = []
+        for kind, metrics in (("counter", snapshot["counters"]), ("summary", snapshot["timers"])):
+            declared = set()
+            for metric in metrics:
+                name = metric["name"]
+                if name not in declared:
+                    lines.append(f"# TYPE {name} {kind}")
+                    declared.add(name)
+                labels = _format_labels(metric["labels"])
+                if kind == "counter":
+                    lines.append(f"{name}{labels} {metric['value']}")
+                else:
+                    lines.append(f"{name}_count{labels} {metric['count']}")
+                    lines.append(f"{name}_sum{labels} {metric['sum']:.6f}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def write(self, path: str) -> None:
+        """Сохраняет метрики в файл: json для расширения .json, иначе текстовый формат Prometheus."""
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+            else:
+                f.write(self.prometheus_text())
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+REGISTRY = Registry(enabled=os.environ.get("PIKTA_METRICS", "0") == "1")
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+
+
+def enable(flag: bool = True) -> None:
+    """Включает или выключает сбор метрик в общем реестре."""
+    REGISTRY.enabled = flag
+
+
+def timed(name: str, **labels):
+    """
+    Декоратор, замеряющий каждый вызов функции в таймер name общего реестра.
+
+    :param name: имя таймера
+    :param labels: метки таймера
+    """
+    key = tuple(sorted(labels.items()))
+
+    def decorator(func):
+        @wraps(func)
+        def inner(*args, **kwargs):
+            if not REGISTRY.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                REGISTRY._observe(name, time.perf_counter() - start, key)
+
+        return inner
+
+    return decorator
+
+
+@contextmanager
+def profile(kind: str = None, output: str = None):
+    """
+    Профилирует блок кода и пишет итоги в лог.
+
+    cprofile выводит PROFILE_TOP функций по суммарному времени и, если задан output, сохраняет
+    статистику для pstats/snakeviz. tracemalloc выводит пик памяти и PROFILE_TOP мест с наибольшим
+    объёмом выделенной памяти.
+
+    :param kind: один из PROFILERS, None - без профилирования
+    :param output: файл для статистики cProfile
+    """
+    if kind is None:
+        yield
+        return
+    if kind not in PROFILERS:
+        raise ValueError(f"Неизвестный профилировщик: {kind}")
+    logger = lg.get_logger()
+    if kind == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            if output:
+                profiler.dump_stats(output)
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            logger.info(report.getvalue())
+        return
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        top = "\n".join(str(stat) for stat in snapshot.statistics("lineno")[:PROFILE_TOP])
+        logger.info(f"Пик памяти: {peak / 2**20:.1f} МиБ\n{top}")
+
+
+def add_cli_arguments(parser: argparse.ArgumentParser) -> None:
+    """Добавляет в парсер аргументы --metrics, --profile и --profile-output."""
+    parser.add_argument("--metrics", help="Файл для метрик: .json - снимок в json, иначе формат Prometheus")
+    parser.add_argument("--profile", choices=PROFILERS, help="Профилировать запуск и вывести итоги в лог")
+    parser.add_argument("--profile-output", help="Файл для статистики cProfile")
+
+
+@contextmanager
+def cli_session(args: argparse.Namespace):
+    """
+    Оборачивает запуск из командной строки: включает метрики и профилирование по аргументам
+    add_cli_arguments и сохраняет метрики по завершении.
+
+    :param args: разобранные аргументы командной строки
+    """
+    if args.metrics:
+        enable()
+    try:
+        with profile(args.profile, args.profile_output):
+            yield
+    finally:
+        if args.metrics:
+            REGISTRY.write(args.metrics)
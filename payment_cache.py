@@ -0,0 +1,187 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from functools import partial
+
+import requests
+
+import http_requests as hr
+
+CACHE_PATH = "payment_cache.sqlite"
+TTL = 7 * 24 * 3600
+STALE_TTL = 30 * 24 * 3600
+NEGATIVE_TTL = 24 * 3600
+MEMORY_SIZE = 4096
+
+
+class PaymentDetailsCache:
+    """
+    Кеш платёжных реквизитов: LRU в памяти процесса поверх таблицы SQLite на диске.
+
+    Свежая запись (моложе ttl) отдаётся сразу. Устаревшая, но моложе ttl + stale_ttl, тоже отдаётся сразу,
+    а в фоне запускается её обновление (stale-while-revalidate). Ответы о неверных кодах кешируются на
+    negative_ttl и приводят к InvalidPaymentCodeError без обращения к сервису.
+    """
+
+    def __init__(
+        self,
+        path: str = CACHE_PATH,
+        ttl: float = TTL,
+        stale_ttl: float = STALE_TTL,
+        negative_ttl: float = NEGATIVE_TTL,
+        memory_size: int = MEMORY_SIZE,
+        fetch: Callable[[int, int], dict] = None,
+        rate: float = hr.RATE_LIMIT,
+    ):
+        """
+        :param path: путь к файлу SQLite, ":memory:" - без сохранения на диск
+        :param ttl: время жизни свежей записи в секундах
+        :param stale_ttl: сколько после ttl ещё отдавать запись, обновляя её в фоне
+        :param negative_ttl: время жизни записи о неверных кодах
+        :param memory_size: число записей в памяти процесса
+        :param fetch: функция запроса реквизитов, по умолчанию fetch_payment_details через общую сессию
+            с повторами и автоматическим выключателем
+        :param rate: максимум запросов к сервису в секунду для fetch по умолчанию; попадания в кеш не ограничиваются
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.memory_size = memory_size
+        self.session = None
+        if fetch is None:
+            self.session = hr.create_session()
+            fetch = hr.rate_limited(
+                partial(hr.fetch_payment_details, session=self.session, breaker=hr.CircuitBreaker()), rate
+            )
+        self.fetch = fetch
+        self.stats = {"hits": 0, "stale_hits": 0, "negative_hits": 0, "misses": 0, "refreshes": 0}
+        self._memory = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute("""CREATE TABLE IF NOT EXISTS payment_details
+                (ifns INT, oktmmf INT, payload TEXT, error TEXT, stored_at REAL, PRIMARY KEY (ifns, oktmmf));""")
+
+    def _remember(self, key: tuple, entry: tuple) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _load(self, key: tuple) -> tuple | None:
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            return entry
+        row = self._db.execute(
+            """SELECT payload, error, stored_at FROM payment_details WHERE ifns = ? AND oktmmf = ?;""", key
+        ).fetchone()
+        if row is None:
+            return None
+        entry = (json.loads(row[0]) if row[0] is not None else None, row[1], row[2])
+        self._remember(key, entry)
+        return entry
+
+    def _store(self, key: tuple, details: dict = None, error: str = None) -> None:
+        entry = (details, error, time.time())
+        with self._lock:
+            self._remember(key, entry)
+            with self._db:
+                self._db.execute(
+                    """INSERT OR REPLACE INTO payment_details VALUES (?, ?, ?, ?, ?);""",
+                    (*key, json.dumps(details, ensure_ascii=False) if details is not None else None, error, entry[2]),
+                )
+
+    def _fetch_and_store(self, key: tuple) -> dict:
+        try:
+            details = self.fetch(*key)
+        except (requests.exceptions.RequestException, KeyError) as e:
+            if hr.is_invalid_code_error(e):
+                self._store(key, error=str(e) or type(e).__name__)
+                raise hr.InvalidPaymentCodeError(str(e)) from e
+            raise
+        self._store(key, details)
+        return details
+
+    def _refresh(self, key: tuple) -> None:
+        try:
+            self._fetch_and_store(key)
+        except requests.exceptions.RequestException:
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(self, ifns: int, oktmmf: int) -> dict:
+        """
+        Возвращает платёжные реквизиты из кеша или с сайта ФНС.
+
+        :param ifns: код ИФНС
+        :param oktmmf: муниципальное образование
+        :returns: платёжные реквизиты; возвращаемый словарь общий для всех вызовов, изменять его нельзя
+        """
+        key = (int(ifns), int(oktmmf))
+        with self._lock:
+            entry = self._load(key)
+            if entry is not None:
+                details, error, stored_at = entry
+                age = time.time() - stored_at
+                if error is not None:
+                    if age < self.negative_ttl:
+                        self.stats["negative_hits"] += 1
+                        raise hr.InvalidPaymentCodeError(error)
+                elif age < self.ttl:
+                    self.stats["hits"] += 1
+                    return details
+                elif age < self.ttl + self.stale_ttl:
+                    self.stats["stale_hits"] += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        self.stats["refreshes"] += 1
+                        threading.Thread(target=self._refresh, args=(key,), daemon=True).start()
+                    return details
+            self.stats["misses"] += 1
+        return self._fetch_and_store(key)
+
+    def is_fresh(self, ifns: int, oktmmf: int) -> bool:
+        """Проверяет, есть ли в кеше непросроченная запись для пары."""
+        with self._lock:
+            entry = self._load((int(ifns), int(oktmmf)))
+        if entry is None:
+            return False
+        return time.time() - entry[2] < (self.negative_ttl if entry[1] is not None else self.ttl)
+
+    def warm(
+        self, pairs: Iterable[tuple[int, int]], workers: int = hr.WORKERS, rate: float = hr.RATE_LIMIT
+    ) -> dict[str, int]:
+        """
+        Прогревает кеш: параллельно запрашивает реквизиты для пар без свежей записи.
+
+        :param pairs: пары (код ИФНС, муниципальное образование)
+        :param workers: число параллельных запросов
+        :param rate: максимум запросов в секунду
+        :returns: число загруженных, отрицательных и неудачных записей
+        """
+        missing = (pair for pair in pairs if not self.is_fresh(*pair))
+        result = {"stored": 0, "negative": 0, "failed": 0}
+        for item in hr.lookup_many(missing, workers, fetch=hr.rate_limited(self.fetch, rate)):
+            key = (int(item["ifns"]), int(item["oktmmf"]))
+            if "payeeDetails" in item:
+                self._store(key, item["payeeDetails"])
+                result["stored"] += 1
+            elif item.get("invalid"):
+                self._store(key, error=item["error"])
+                result["negative"] += 1
+            else:
+                result["failed"] += 1
+        return result
+
+    def close(self) -> None:
+        """Закрывает файл кеша и сессию."""
+        self._db.close()
+        if self.session is not None:
+            self.session.close()
@@ -0,0 +1,150 @@
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from functools import partial
+
+import sql_pool
+import sql_task as st
+
+READERS = 4
+BUSY_TIMEOUT = 30.0
+
+
+class AsyncReports:
+    """
+    Асинхронный фасад над отчётами и загрузкой sql_task.
+
+    Запросы на чтение выполняются в пуле из readers потоков, у каждого из которых своё подключение,
+    а все записи - в единственном потоке-писателе. База переводится в режим WAL, поэтому чтения идут
+    параллельно с записью, а цикл событий не блокируется вызовами sqlite3.
+    """
+
+    def __init__(self, path: str = sql_pool.DB_PATH, readers: int = READERS):
+        """
+        :param path: путь к файлу базы данных
+        :param readers: число потоков чтения
+        """
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        with closing(sqlite3.connect(path, timeout=BUSY_TIMEOUT)) as connection, connection:
+            connection.execute("PRAGMA journal_mode = WAL;")
+            st.create_tables(connection.cursor())
+        self._readers = ThreadPoolExecutor(
+            max_workers=readers, thread_name_prefix="sql-reader", initializer=self._open, initargs=(True,)
+        )
+        self._writer = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="sql-writer", initializer=self._open, initargs=(False,)
+        )
+
+    def _open(self, read_only: bool) -> None:
+        connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        if read_only:
+            connection.execute("PRAGMA query_only = ON;")
+        self._local.connection = connection
+        with self._lock:
+            self._connections.append(connection)
+
+    def _call(self, func: callable, args: tuple, kwargs: dict):
+        connection = self._local.connection
+        with connection:
+            return func(*args, cursor=connection.cursor(), **kwargs)
+
+    async def _submit(self, executor: ThreadPoolExecutor, func: callable, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, partial(self._call, func, args, kwargs))
+
+    async def clients_with_purchases_sum(self) -> list[tuple]:
+        return await self._submit(self._readers, st.return_clients_with_purchases_sum)
+
+    async def clients_who_bought_phone(self) -> list[tuple]:
+        return await self._submit(self._readers, st.return_clients_who_bought_phone)
+
+    async def customs_count_by_name(self) -> list[tuple]:
+        return await self._submit(self._readers, st.return_customs_count_by_name)
+
+    async def page_clients_with_purchases_sum(self, after: str = None, limit: int = st.PAGE_SIZE) -> list[tuple]:
+        return await self._submit(self._readers, st.page_clients_with_purchases_sum, after=after, limit=limit)
+
+    async def page_clients_who_bought_phone(self, after: str = None, limit: int = st.PAGE_SIZE) -> list[tuple]:
+        return await self._submit(self._readers, st.page_clients_who_bought_phone, after=after, limit=limit)
+
+    async def page_customs_count_by_name(self, after: str = None, limit: int = st.PAGE_SIZE) -> list[tuple]:
+        return await self._submit(self._readers, st.page_customs_count_by_name, after=after, limit=limit)
+
+    async def fill(self, users: list[tuple], products: list[tuple], orders: list[tuple]) -> None:
+        await self._submit(self._writer, st.fill_db, users, products, orders)
+
+    async def bulk_load(self, **kwargs) -> dict[str, tuple[int, float]]:
+        """Выполняет sql_task.bulk_load в потоке-писателе; аргументы те же, кроме cursor."""
+        return await self._submit(self._writer, st.bulk_load, **kwargs)
+
+    async def rebuild_summaries(self) -> None:
+        await self._submit(self._writer, st.rebuild_summaries)
+
+    def close(self) -> None:
+        """Дожидается выполнения поставленных запросов и закрывает подключения."""
+        self._readers.shutdown()
+        self._writer.shutdown()
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+
+    async def __aenter__(self) -> "AsyncReports":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+_default_reports = None
+_default_lock = threading.Lock()
+
+
+def configure(path: str = sql_pool.DB_PATH, readers: int = READERS) -> AsyncReports:
+    """
+    Создаёт фасад по умолчанию для функций модуля, закрывая предыдущий.
+
+    :param path: путь к файлу базы данных
+    :param readers: число потоков чтения
+    :returns: новый фасад по умолчанию
+    """
+    global _default_reports
+    with _default_lock:
+        if _default_reports is not None:
+            _default_reports.close()
+        _default_reports = AsyncReports(path, readers)
+        return _default_reports
+
+
+def get_reports() -> AsyncReports:
+    """Возвращает фасад по умолчанию, создавая его при первом обращении."""
+    global _default_reports
+    with _default_lock:
+        if _default_reports is None:
+            _default_reports = AsyncReports()
+        return _default_reports
+
+
+async def clients_with_purchases_sum() -> list[tuple]:
+    """Асинхронный вариант sql_task.return_clients_with_purchases_sum."""
+    return await get_reports().clients_with_purchases_sum()
+
+
+async def clients_who_bought_phone() -> list[tuple]:
+    """Асинхронный вариант sql_task.return_clients_who_bought_phone."""
+    return await get_reports().clients_who_bought_phone()
+
+
+async def customs_count_by_name() -> list[tuple]:
+    """Асинхронный вариант sql_task.return_customs_count_by_name."""
+    return await get_reports().customs_count_by_name()
+
+
+async def fill_db(users: list[tuple], products: list[tuple], orders: list[tuple]) -> None:
+    """Асинхронный вариант sql_task.fill_db."""
+    await get_reports().fill(users, products, orders)
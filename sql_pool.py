@@ -0,0 +1,121 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DB_PATH = os.environ.get("PIKTA_DB_PATH", "sqlite_python.db")
+POOL_SIZE = 4
+STATEMENT_CACHE_SIZE = 256
+DEFAULT_PRAGMAS = {"temp_store": "MEMORY"}
+
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул подключений к SQLite.
+
+    Подключения создаются лениво, не больше size штук, и живут всё время работы пула, поэтому
+    подготовленные выражения из встроенного кеша sqlite3 переиспользуются между вызовами.
+    """
+
+    def __init__(self, path: str = DB_PATH, size: int = POOL_SIZE, pragmas: dict = None, timeout: float = None):
+        """
+        :param path: путь к файлу базы данных
+        :param size: максимальное число подключений
+        :param pragmas: настройки PRAGMA, применяемые к каждому новому подключению
+        :param timeout: сколько ждать свободного подключения, по умолчанию без ограничения
+        """
+        self.path = path
+        self.size = size
+        self.pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        for name, value in self.pragmas.items():
+            connection.execute(f"PRAGMA {name} = {value};")
+        return connection
+
+    def acquire(self) -> sqlite3.Connection:
+        """Берёт свободное подключение из пула или создаёт новое, если лимит не исчерпан."""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Пул подключений закрыт")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except BaseException:
+                    self._created -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError("Нет свободных подключений к базе данных") from None
+
+    def release(self, connection: sqlite3.Connection) -> None:
+        """Возвращает подключение в пул."""
+        if self._closed:
+            connection.close()
+        else:
+            self._idle.put(connection)
+
+    @contextmanager
+    def connection(self):
+        """
+        Контекстный менеджер подключения: фиксирует транзакцию при успехе и откатывает при ошибке,
+        как sqlite3.connect в блоке with.
+        """
+        connection = self.acquire()
+        try:
+            with connection:
+                yield connection
+        finally:
+            self.release(connection)
+
+    def close(self) -> None:
+        """Закрывает свободные подключения; занятые закроются при возврате в пул."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+
+def configure(path: str = DB_PATH, size: int = POOL_SIZE, pragmas: dict = None) -> ConnectionPool:
+    """
+    Создаёт пул по умолчанию с заданными параметрами, закрывая предыдущий.
+
+    :param path: путь к файлу базы данных
+    :param size: максимальное число подключений
+    :param pragmas: настройки PRAGMA для каждого подключения
+    :returns: новый пул по умолчанию
+    """
+    global _default_pool
+    with _default_lock:
+        if _default_pool is not None:
+            _default_pool.close()
+        _default_pool = ConnectionPool(path, size, pragmas)
+        return _default_pool
+
+
+def get_pool() -> ConnectionPool:
+    """Возвращает пул по умолчанию, создавая его при первом обращении."""
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = ConnectionPool()
+        return _default_pool
@@ -1,12 +1,229 @@
+import argparse
 import sqlite3
+import time
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from itertools import islice
 from sqlite3 import Cursor
 
+import logger as lg
+import metrics
+import sql_pool
+
+BATCH_SIZE = 10000
+FETCH_SIZE = 1000
+PAGE_SIZE = 100
+FAST_LOAD_PRAGMAS = {"journal_mode": "WAL", "synchronous": "NORMAL", "cache_size": -65536}
+PHONE_PRODUCT_NAME = "Телефон"
+QUERY_TIMER = "sql_task_query_seconds"
+LOAD_TIMER = "sql_task_load_seconds"
+LOADED_ROWS_COUNTER = "sql_task_loaded_rows_total"
+# Ключ 0 в сводных таблицах обозначает заказы без клиента или товара (NULL в orders).
+# Вставка заказа прибавляет цену к сумме клиента за O(1). Удаление и перенос заказа, а также изменение цены
+# пересчитывают сумму через SUM по заказам клиента (поиск по idx_orders_client_product): так сложение идёт
+# в том же порядке по товарам, что и в return_clients_with_purchases_sum, и итог совпадает с ним до бита.
+# Массовые загрузки (fill_db, bulk_load) идут без триггеров заказов и пересчитывают сводные таблицы целиком.
+_CLIENT_TOTAL = """(SELECT IFNULL(SUM(price), 0) FROM orders
+                LEFT JOIN products ON products.product_id = orders.product_id
+                WHERE orders.client_id IS {client})"""
+_RECOMPUTE_CLIENT_TOTALS = f"""UPDATE client_totals SET
+            priced_count = (SELECT COUNT(price) FROM orders
+                LEFT JOIN products ON products.product_id = orders.product_id
+                WHERE orders.client_id IS NULLIF(client_totals.client_id, 0)),
+            total = {_CLIENT_TOTAL.format(client="NULLIF(client_totals.client_id, 0)")}
+            WHERE client_id IN (SELECT IFNULL(client_id, 0) FROM orders WHERE product_id = {{product}}.product_id);"""
+_ADD_ORDER = """INSERT INTO client_totals(client_id, order_count, priced_count, total)
+            SELECT IFNULL(NEW.client_id, 0), 1, COUNT(price), {total}
+            FROM (SELECT (SELECT price FROM products WHERE product_id = NEW.product_id) AS price) WHERE true
+            ON CONFLICT(client_id) DO UPDATE SET
+            order_count = order_count + 1,
+            priced_count = priced_count + excluded.priced_count,
+            total = {conflict_total};
+        INSERT INTO product_order_counts(product_id, order_count) VALUES (IFNULL(NEW.product_id, 0), 1)
+            ON CONFLICT(product_id) DO UPDATE SET order_count = order_count + 1;"""
+_REMOVE_ORDER = f"""UPDATE client_totals SET
+            order_count = order_count - 1,
+            priced_count = priced_count - (price IS NOT NULL),
+            total = {_CLIENT_TOTAL.format(client="OLD.client_id")}
+            FROM (SELECT (SELECT price FROM products WHERE product_id = OLD.product_id) AS price)
+            WHERE client_id = IFNULL(OLD.client_id, 0);
+        DELETE FROM client_totals WHERE client_id = IFNULL(OLD.client_id, 0) AND order_count = 0;
+        UPDATE product_order_counts SET order_count = order_count - 1 WHERE product_id = IFNULL(OLD.product_id, 0);
+        DELETE FROM product_order_counts WHERE product_id = IFNULL(OLD.product_id, 0) AND order_count = 0;"""
+REBUILD_SUMMARIES_STATEMENTS = [
+    """DELETE FROM client_totals;""",
+    """INSERT INTO client_totals(client_id, order_count, priced_count, total)
+        SELECT IFNULL(client_id, 0), COUNT(*), COUNT(price), IFNULL(SUM(price), 0)
+        FROM orders LEFT JOIN products ON products.product_id = orders.product_id
+        GROUP BY IFNULL(client_id, 0);""",
+    """DELETE FROM product_order_counts;""",
+    """INSERT INTO product_order_counts(product_id, order_count)
+        SELECT IFNULL(product_id, 0), COUNT(*) FROM orders GROUP BY IFNULL(product_id, 0);""",
+]
+ORDER_TRIGGER_NAMES = ("trg_orders_insert", "trg_orders_delete", "trg_orders_update")
+ORDER_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS trg_orders_insert AFTER INSERT ON orders BEGIN
+            {_ADD_ORDER.format(total="IFNULL(SUM(price), 0)", conflict_total="total + excluded.total")}
+            END;""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_orders_delete AFTER DELETE ON orders BEGIN
+            {_REMOVE_ORDER}
+            END;""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_orders_update AFTER UPDATE OF client_id, product_id ON orders BEGIN
+            {_REMOVE_ORDER}
+            {_ADD_ORDER.format(total=_CLIENT_TOTAL.format(client="NEW.client_id"), conflict_total="excluded.total")}
+            END;""",
+]
+_REPLACE_ORDER_TRIGGERS = [
+    *(f"""DROP TRIGGER IF EXISTS {name};""" for name in ORDER_TRIGGER_NAMES),
+    *ORDER_TRIGGERS,
+    *REBUILD_SUMMARIES_STATEMENTS,
+]
+# Дубли по естественным ключам (имя клиента, имя товара, клиент + товар + название заказа) сводятся
+# к строке с наименьшим id, заказы перевешиваются на неё; у товара остаётся цена из последней загрузки.
+_DUPLICATE_CLIENTS = """SELECT client_id FROM clients AS c WHERE EXISTS
+            (SELECT 1 FROM clients AS d WHERE d.client_name = c.client_name AND d.client_id < c.client_id)"""
+_DUPLICATE_PRODUCTS = """SELECT product_id FROM products AS p WHERE EXISTS
+            (SELECT 1 FROM products AS d WHERE d.product_name = p.product_name AND d.product_id < p.product_id)"""
+DEDUPE_STATEMENTS = [
+    f"""UPDATE orders SET client_id = (SELECT MIN(d.client_id) FROM clients AS c
+            JOIN clients AS d ON d.client_name = c.client_name WHERE c.client_id = orders.client_id)
+        WHERE client_id IN ({_DUPLICATE_CLIENTS});""",
+    f"""DELETE FROM clients WHERE client_id IN ({_DUPLICATE_CLIENTS});""",
+    """UPDATE products SET price = (SELECT d.price FROM products AS d
+            WHERE d.product_name = products.product_name ORDER BY d.product_id DESC LIMIT 1)
+        WHERE product_id IN (SELECT MIN(product_id) FROM products GROUP BY product_name HAVING COUNT(*) > 1);""",
+    f"""UPDATE orders SET product_id = (SELECT MIN(d.product_id) FROM products AS p
+            JOIN products AS d ON d.product_name = p.product_name WHERE p.product_id = orders.product_id)
+        WHERE product_id IN ({_DUPLICATE_PRODUCTS});""",
+    f"""DELETE FROM products WHERE product_id IN ({_DUPLICATE_PRODUCTS});""",
+    """DELETE FROM orders WHERE EXISTS (SELECT 1 FROM orders AS d
+            WHERE d.client_id IS orders.client_id AND d.product_id IS orders.product_id
+            AND d.order_name IS orders.order_name AND d.order_id < orders.order_id);""",
+]
+MIGRATIONS = [
+    (
+        1,
+        [
+            """CREATE INDEX IF NOT EXISTS idx_orders_client_product ON orders(client_id, product_id);""",
+            """CREATE INDEX IF NOT EXISTS idx_orders_product_client ON orders(product_id, client_id);""",
+            """CREATE INDEX IF NOT EXISTS idx_products_name ON products(product_name, product_id);""",
+        ],
+    ),
+    (
+        2,
+        [
+            """CREATE TABLE IF NOT EXISTS client_totals
+            (client_id INTEGER PRIMARY KEY, order_count INT NOT NULL,
+            priced_count INT NOT NULL, total REAL NOT NULL);""",
+            """CREATE TABLE IF NOT EXISTS product_order_counts
+            (product_id INTEGER PRIMARY KEY, order_count INT NOT NULL);""",
+            *ORDER_TRIGGERS,
+            f"""CREATE TRIGGER IF NOT EXISTS trg_products_insert AFTER INSERT ON products BEGIN
+            {_RECOMPUTE_CLIENT_TOTALS.format(product="NEW")}
+            END;""",
+            f"""CREATE TRIGGER IF NOT EXISTS trg_products_delete AFTER DELETE ON products BEGIN
+            {_RECOMPUTE_CLIENT_TOTALS.format(product="OLD")}
+            END;""",
+            f"""CREATE TRIGGER IF NOT EXISTS trg_products_update AFTER UPDATE OF product_id, price ON products BEGIN
+            {_RECOMPUTE_CLIENT_TOTALS.format(product="OLD")}
+            {_RECOMPUTE_CLIENT_TOTALS.format(product="NEW")}
+            END;""",
+            *REBUILD_SUMMARIES_STATEMENTS,
+        ],
+    ),
+    (
+        3,
+        [
+            """CREATE INDEX IF NOT EXISTS idx_clients_name ON clients(client_name, client_id);""",
+        ],
+    ),
+    (
+        4,
+        [
+            # Уникальные индексы заменяют прежние под теми же именами: rowid хранится в индексе,
+            # поэтому они остаются покрывающими для отчётных запросов. На базе с дублями миграция
+            # не проходит, пока дубли не удалит compact_db (python sql_task.py --compact).
+            """DROP INDEX IF EXISTS idx_clients_name;""",
+            """CREATE UNIQUE INDEX idx_clients_name ON clients(client_name);""",
+            """DROP INDEX IF EXISTS idx_products_name;""",
+            """CREATE UNIQUE INDEX idx_products_name ON products(product_name);""",
+            """DROP INDEX IF EXISTS idx_orders_client_product;""",
+            """CREATE UNIQUE INDEX idx_orders_client_product ON orders(client_id, product_id, order_name);""",
+        ],
+    ),
+    (5, _REPLACE_ORDER_TRIGGERS),
+    # Вставка заказа снова обновляет сумму клиента прибавлением: пересчёт SUM на каждую вставку
+    # делал загрузку квадратичной по числу заказов клиента.
+    (6, _REPLACE_ORDER_TRIGGERS),
+]
+CLIENTS_WITH_PURCHASES_SUM_QUERY = """SELECT client_name, SUM(price)
+        FROM orders
+        LEFT JOIN products ON products.product_id = orders.product_id
+        LEFT JOIN clients ON clients.client_id = orders.client_id
+        GROUP BY client_name;"""
+CLIENTS_WHO_BOUGHT_PRODUCT_QUERY = """SELECT client_name
+        FROM products
+        JOIN orders ON orders.product_id = products.product_id
+        LEFT JOIN clients ON clients.client_id = orders.client_id
+        WHERE product_name = ?;"""
+CUSTOMS_COUNT_BY_NAME_QUERY = """SELECT product_name, COUNT(product_name)
+        FROM orders
+        LEFT JOIN products ON products.product_id = orders.product_id
+        GROUP BY product_name;"""
+# Запросы постраничной выдачи идут по индексам имён и останавливаются после limit групп.
+# Первая страница выбирается условием ">= ''", следующие - "> последнее имя".
+PAGE_CLIENTS_WITH_PURCHASES_SUM_QUERY = """SELECT client_name, SUM(price)
+        FROM clients
+        JOIN orders ON orders.client_id = clients.client_id
+        LEFT JOIN products ON products.product_id = orders.product_id
+        WHERE client_name {op} ?
+        GROUP BY client_name
+        ORDER BY client_name
+        LIMIT ?;"""
+PAGE_CLIENTS_WHO_BOUGHT_PRODUCT_QUERY = """SELECT DISTINCT client_name
+        FROM products
+        JOIN orders ON orders.product_id = products.product_id
+        JOIN clients ON clients.client_id = orders.client_id
+        WHERE product_name = ? AND client_name {op} ?
+        ORDER BY client_name
+        LIMIT ?;"""
+PAGE_CUSTOMS_COUNT_BY_NAME_QUERY = """SELECT product_name, COUNT(product_name)
+        FROM products
+        JOIN orders ON orders.product_id = products.product_id
+        WHERE product_name {op} ?
+        GROUP BY product_name
+        ORDER BY product_name
+        LIMIT ?;"""
+SUMMARY_CLIENTS_WITH_PURCHASES_SUM_QUERY = """SELECT client_name, CASE WHEN SUM(priced_count) > 0 THEN SUM(total) END
+        FROM client_totals
+        LEFT JOIN clients ON clients.client_id = client_totals.client_id
+        GROUP BY client_name;"""
+SUMMARY_CUSTOMS_COUNT_BY_NAME_QUERY = """SELECT product_name,
+        SUM(CASE WHEN product_name IS NULL THEN 0 ELSE order_count END)
+        FROM product_order_counts
+        LEFT JOIN products ON products.product_id = product_order_counts.product_id
+        GROUP BY product_name;"""
+# Загрузка идемпотентна: уже загруженные строки пропускаются, у товара обновляется только изменившаяся цена.
+# Исключение - строки с NULL в ключе: уникальный индекс SQLite считает NULL различными, поэтому клиенты
+# и товары без имени и заказы без клиента, товара или названия при повторной загрузке дублируются.
+# Такие дубли удаляет compact_db.
+LOAD_STATEMENTS = {
+    "clients": """INSERT INTO clients(client_name) VALUES (?)
+        ON CONFLICT(client_name) DO NOTHING;""",
+    "products": """INSERT INTO products(product_name, price) VALUES (?, ?)
+        ON CONFLICT(product_name) DO UPDATE SET price = excluded.price WHERE price IS NOT excluded.price;""",
+    "orders": """INSERT INTO orders(client_id, product_id, order_name) VALUES (?, ?, ?)
+        ON CONFLICT(client_id, product_id, order_name) DO NOTHING;""",
+}
+
 
 def connect_gracefully(func: callable) -> callable:
-    """Декоратор для безопасного подключения к бд."""
+    """Декоратор для безопасного подключения к бд через пул подключений по умолчанию (sql_pool.configure)."""
 
+    @wraps(func)
     def inner(**kwargs):
-        with sqlite3.connect("sqlite_python.db") as connection:
+        with sql_pool.get_pool().connection() as connection:
             cursor = connection.cursor()
             kwargs["cursor"] = cursor
             return func(**kwargs)
@@ -48,58 +265,236 @@ def execute_functions(cursor: Cursor) -> callable:
     print(return_customs_count_by_name(cursor))
 
 
+def create_tables(cursor: Cursor) -> None:
+    """
+    Функция создающая таблицы базы данных, если их ещё нет.
+
+    :param cursor: курсор подключения к базе данных
+    """
+    cursor.execute("""CREATE TABLE IF NOT EXISTS clients
+        (client_id INTEGER PRIMARY KEY AUTOINCREMENT, client_name CHAR);""")
+    cursor.execute("""CREATE TABLE IF NOT EXISTS products
+        (product_id INTEGER PRIMARY KEY AUTOINCREMENT, product_name CHAR, price REAL);""")
+    cursor.execute("""CREATE TABLE IF NOT EXISTS orders
+        (order_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        client_id INT, product_id INT, order_name CHAR,
+        CONSTRAINT fk_client FOREIGN KEY (client_id)
+        REFERENCES clients (client_id)
+        ON DELETE CASCADE,
+        CONSTRAINT fk_product FOREIGN KEY (product_id)
+        REFERENCES products (product_id)
+        ON DELETE CASCADE);""")
+    cursor.connection.commit()
+    migrate_schema(cursor)
+    restore_order_triggers(cursor)
+
+
+def migrate_schema(cursor: Cursor) -> int:
+    """
+    Функция применяющая к базе данных ещё не применённые миграции из MIGRATIONS.
+
+    Номер последней применённой миграции хранится в PRAGMA user_version. Каждая миграция выполняется
+    в одной транзакции: при ошибке схема остаётся в прежней версии.
+
+    :param cursor: курсор подключения к базе данных
+    :returns: версия схемы после миграции
+    :raises sqlite3.IntegrityError: если в базе есть дубли по естественным ключам, см. compact_db
+    """
+    version = cursor.execute("PRAGMA user_version;").fetchone()[0]
+    for target, statements in MIGRATIONS:
+        if target <= version:
+            continue
+        cursor.connection.commit()
+        cursor.execute("BEGIN;")
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute(f"PRAGMA user_version = {target};")
+        except sqlite3.Error as e:
+            cursor.connection.rollback()
+            if isinstance(e, sqlite3.IntegrityError):
+                lg.get_logger().error(
+                    f"Миграция схемы {target} не применена: {e}. Удалите дубли командой python sql_task.py --compact"
+                )
+            raise
+        cursor.connection.commit()
+        version = target
+    return version
+
+
+@metrics.timed(LOAD_TIMER, table="all")
 def fill_db(users: list[tuple], products: list[tuple], orders: list[tuple], cursor: Cursor) -> None:
     """
     Функция заполняющая базу данных.
 
+    Строки, уже загруженные раньше, не дублируются (см. LOAD_STATEMENTS), поэтому повторный запуск
+    с теми же данными не меняет базу. Исключение - строки с NULL в естественном ключе.
+    Заказы вставляются без триггеров, после чего сводные таблицы пересчитываются целиком.
+
     :param users: объекты на заполнения таблицы clients
     :param products: объекты на заполнения таблицы products
     :param orders: объекты на заполнения таблицы orders
     :param cursor: курсор подключения к базе данных
     """
-    cursor.execute(
-        """CREATE TABLE IF NOT EXISTS clients
-        (client_id INTEGER PRIMARY KEY AUTOINCREMENT, client_name CHAR);"""
-    )
+    create_tables(cursor)
 
-    cursor.executemany(
-        """INSERT INTO clients(client_name) VALUES (?);""",
-        users,
-    )
+    cursor.executemany(LOAD_STATEMENTS["clients"], users)
+    cursor.connection.commit()
 
+    cursor.executemany(LOAD_STATEMENTS["products"], products)
     cursor.connection.commit()
 
-    cursor.execute(
-        """CREATE TABLE IF NOT EXISTS products
-        (product_id INTEGER PRIMARY KEY AUTOINCREMENT, product_name CHAR, price REAL);"""
-    )
+    with order_triggers_deferred(cursor):
+        cursor.executemany(LOAD_STATEMENTS["orders"], orders)
+        cursor.connection.commit()
+
 
-    cursor.executemany(
-        """INSERT INTO products(product_name, price) VALUES (?, ?);""",
-        products,
-    )
+@contextmanager
+def fast_load_pragmas(cursor: Cursor, pragmas: dict = None):
+    """
+    Контекстный менеджер, включающий на время загрузки быстрые настройки SQLite и восстанавливающий прежние.
 
+    :param cursor: курсор подключения к базе данных
+    :param pragmas: настройки PRAGMA, по умолчанию FAST_LOAD_PRAGMAS (WAL, synchronous=NORMAL, большой кеш)
+    """
+    pragmas = FAST_LOAD_PRAGMAS if pragmas is None else pragmas
     cursor.connection.commit()
+    previous = {name: cursor.execute(f"PRAGMA {name};").fetchone()[0] for name in pragmas}
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name} = {value};")
+    try:
+        yield cursor
+    finally:
+        cursor.connection.commit()
+        for name, value in previous.items():
+            cursor.execute(f"PRAGMA {name} = {value};")
 
-    cursor.execute(
-        """CREATE TABLE IF NOT EXISTS orders
-        (order_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        client_id INT, product_id INT, order_name CHAR,
-        CONSTRAINT fk_client FOREIGN KEY (client_id)
-        REFERENCES clients (client_id)
-        ON DELETE CASCADE,
-        CONSTRAINT fk_product FOREIGN KEY (product_id)
-        REFERENCES products (product_id)
-        ON DELETE CASCADE);"""
-    )
 
-    cursor.executemany(
-        """INSERT INTO orders(client_id, product_id, order_name) VALUES (?, ?, ?);""",
-        orders,
-    )
+def restore_order_triggers(cursor: Cursor, rebuild: bool = False) -> None:
+    """
+    Создаёт недостающие триггеры заказов и пересчитывает сводные таблицы, если триггеров не было.
+
+    Триггеры могут отсутствовать, если массовая загрузка прервалась, не успев их вернуть.
+
+    :param cursor: курсор подключения к базе данных
+    :param rebuild: пересчитать сводные таблицы, даже если все триггеры на месте
+    """
+    existing = {name for (name,) in cursor.execute("""SELECT name FROM sqlite_master WHERE type = 'trigger';""")}
+    if not rebuild and existing.issuperset(ORDER_TRIGGER_NAMES):
+        return
+    for statement in ORDER_TRIGGERS:
+        cursor.execute(statement)
+    rebuild_summaries(cursor)
+
+
+@contextmanager
+def order_triggers_deferred(cursor: Cursor):
+    """
+    Контекстный менеджер, снимающий триггеры заказов на время массовой загрузки.
+
+    После загрузки триггеры возвращаются, а сводные таблицы пересчитываются одним проходом, поэтому
+    суммы клиентов совпадают с return_clients_with_purchases_sum до бита. Незафиксированные изменения
+    при ошибке откатываются.
+
+    :param cursor: курсор подключения к базе данных
+    """
+    cursor.connection.commit()
+    for name in ORDER_TRIGGER_NAMES:
+        cursor.execute(f"""DROP TRIGGER IF EXISTS {name};""")
+    cursor.connection.commit()
+    try:
+        yield cursor
+    except BaseException:
+        cursor.connection.rollback()
+        raise
+    finally:
+        restore_order_triggers(cursor, rebuild=True)
+
+
+def bulk_insert(
+    cursor: Cursor,
+    table: str,
+    rows: Iterable[tuple],
+    batch_size: int = BATCH_SIZE,
+    progress: Callable[[str, int, float], None] = None,
+) -> int:
+    """
+    Потоково загружает строки в таблицу пачками, каждая пачка - в отдельной явной транзакции.
+
+    Строки с уже существующим естественным ключом не вставляются повторно (см. LOAD_STATEMENTS).
+
+    Строки читаются из итератора по batch_size штук, поэтому в памяти не держится больше одной пачки.
+    Проверка внешних ключей внутри транзакции откладывается до её фиксации.
+
+    :param cursor: курсор подключения к базе данных
+    :param table: имя таблицы, один из ключей LOAD_STATEMENTS
+    :param rows: итерируемый объект или генератор строк
+    :param batch_size: число строк в одной транзакции
+    :param progress: функция (таблица, вставлено строк, прошло секунд), вызываемая после каждой пачки
+    :returns: число обработанных строк
+    """
+    statement = LOAD_STATEMENTS[table]
+    iterator = iter(rows)
+    total = 0
+    start = time.perf_counter()
     cursor.connection.commit()
+    while batch := list(islice(iterator, batch_size)):
+        with metrics.timer(LOAD_TIMER, table=table):
+            cursor.execute("BEGIN;")
+            try:
+                cursor.execute("PRAGMA defer_foreign_keys = ON;")
+                cursor.executemany(statement, batch)
+                cursor.execute("COMMIT;")
+            except BaseException:
+                cursor.execute("ROLLBACK;")
+                raise
+        total += len(batch)
+        metrics.inc(LOADED_ROWS_COUNTER, len(batch), table=table)
+        if progress is not None:
+            progress(table, total, time.perf_counter() - start)
+    return total
+
+
+def bulk_load(
+    cursor: Cursor,
+    users: Iterable[tuple] = (),
+    products: Iterable[tuple] = (),
+    orders: Iterable[tuple] = (),
+    batch_size: int = BATCH_SIZE,
+    tune: bool = True,
+    progress: Callable[[str, int, float], None] = None,
+) -> dict[str, tuple[int, float]]:
+    """
+    Функция массовой загрузки данных в базу, аналог fill_db для больших объёмов.
+
+    Принимает генераторы строк, вставляет их пачками в явных транзакциях и пишет в лог скорость загрузки.
+    Сводные таблицы пересчитываются один раз после загрузки (см. order_triggers_deferred).
+
+    :param cursor: курсор подключения к базе данных
+    :param users: объекты на заполнения таблицы clients
+    :param products: объекты на заполнения таблицы products
+    :param orders: объекты на заполнения таблицы orders
+    :param batch_size: число строк в одной транзакции
+    :param tune: включить на время загрузки WAL, synchronous=NORMAL и увеличенный кеш
+    :param progress: функция (таблица, вставлено строк, прошло секунд), вызываемая после каждой пачки
+    :returns: словарь таблица -> (число строк, время загрузки в секундах)
+    """
+    logger = lg.get_logger()
+    create_tables(cursor)
+    stats = {}
+    with fast_load_pragmas(cursor) if tune else nullcontext(), order_triggers_deferred(cursor):
+        for table, rows in (("clients", users), ("products", products), ("orders", orders)):
+            start = time.perf_counter()
+            count = bulk_insert(cursor, table, rows, batch_size, progress)
+            elapsed = time.perf_counter() - start
+            stats[table] = (count, elapsed)
+            if count:
+                rate = count / max(elapsed, 1e-9)
+                logger.info(f"Загружено {count} строк в {table} за {elapsed:.2f} с ({rate:.0f} строк/с)")
+    return stats
 
 
+@metrics.timed(QUERY_TIMER, query="clients_with_purchases_sum")
 def return_clients_with_purchases_sum(cursor: Cursor) -> list[tuple]:
     """
     Возвращает список клиентов с общей суммой их покупки.
@@ -107,18 +502,11 @@ def return_clients_with_purchases_sum(cursor: Cursor) -> list[tuple]:
     :param cursor: курсор подключения к базе данных
     :returns: список клиентов с общей суммой их покупки
     """
-    cursor.execute(
-        """SELECT client_name, SUM(price)
-        FROM (SELECT client_id, price
-        FROM orders LEFT JOIN products
-        ON orders.product_id = products.product_id) AS gr
-        LEFT JOIN clients
-        ON clients.client_id = gr.client_id
-        GROUP BY client_name;"""
-    )
+    cursor.execute(CLIENTS_WITH_PURCHASES_SUM_QUERY)
     return cursor.fetchall()
 
 
+@metrics.timed(QUERY_TIMER, query="clients_who_bought_phone")
 def return_clients_who_bought_phone(cursor: Cursor) -> list[tuple]:
     """
     Возвращает список клиентов, которые купили телефон.
@@ -126,18 +514,11 @@ def return_clients_who_bought_phone(cursor: Cursor) -> list[tuple]:
     :param cursor: курсор подключения к базе данных
     :returns: список клиентов, которые купили телефон
     """
-    cursor.execute(
-        """SELECT client_name
-        FROM (SELECT client_id, product_name
-        FROM orders LEFT JOIN products
-        ON orders.product_id = products.product_id) AS gr
-        LEFT JOIN clients
-        ON clients.client_id = gr.client_id
-        WHERE product_name='Телефон';"""
-    )
+    cursor.execute(CLIENTS_WHO_BOUGHT_PRODUCT_QUERY, (PHONE_PRODUCT_NAME,))
     return cursor.fetchall()
 
 
+@metrics.timed(QUERY_TIMER, query="customs_count_by_name")
 def return_customs_count_by_name(cursor: Cursor) -> list[tuple]:
     """
     Возвращает список товаров с количеством их заказа.
@@ -145,15 +526,292 @@ def return_customs_count_by_name(cursor: Cursor) -> list[tuple]:
     :param cursor: курсор подключения к базе данных
     :returns: список товаров с количеством их заказа
     """
-    cursor.execute(
-        """SELECT product_name, COUNT(product_name)
-        FROM orders LEFT JOIN products
-        ON orders.product_id = products.product_id
-        GROUP BY product_name;
-        """
-    )
+    cursor.execute(CUSTOMS_COUNT_BY_NAME_QUERY)
     return cursor.fetchall()
 
 
+def iter_rows(cursor: Cursor, batch_size: int = FETCH_SIZE) -> Iterator[tuple]:
+    """
+    Построчно отдаёт результат выполненного запроса, забирая его из курсора пачками через fetchmany.
+
+    :param cursor: курсор с выполненным запросом
+    :param batch_size: размер пачки
+    :returns: итератор строк результата
+    """
+    while rows := cursor.fetchmany(batch_size):
+        yield from rows
+
+
+def iter_clients_with_purchases_sum(cursor: Cursor, batch_size: int = FETCH_SIZE) -> Iterator[tuple]:
+    """
+    Генератор клиентов с общей суммой их покупки, потоковый вариант return_clients_with_purchases_sum.
+
+    :param cursor: курсор подключения к базе данных
+    :param batch_size: размер пачки fetchmany
+    :returns: итератор клиентов с общей суммой их покупки
+    """
+    cursor.execute(CLIENTS_WITH_PURCHASES_SUM_QUERY)
+    yield from iter_rows(cursor, batch_size)
+
+
+def iter_clients_who_bought_phone(cursor: Cursor, batch_size: int = FETCH_SIZE) -> Iterator[tuple]:
+    """
+    Генератор клиентов, которые купили телефон, потоковый вариант return_clients_who_bought_phone.
+
+    :param cursor: курсор подключения к базе данных
+    :param batch_size: размер пачки fetchmany
+    :returns: итератор клиентов, которые купили телефон
+    """
+    cursor.execute(CLIENTS_WHO_BOUGHT_PRODUCT_QUERY, (PHONE_PRODUCT_NAME,))
+    yield from iter_rows(cursor, batch_size)
+
+
+def iter_customs_count_by_name(cursor: Cursor, batch_size: int = FETCH_SIZE) -> Iterator[tuple]:
+    """
+    Генератор товаров с количеством их заказа, потоковый вариант return_customs_count_by_name.
+
+    :param cursor: курсор подключения к базе данных
+    :param batch_size: размер пачки fetchmany
+    :returns: итератор товаров с количеством их заказа
+    """
+    cursor.execute(CUSTOMS_COUNT_BY_NAME_QUERY)
+    yield from iter_rows(cursor, batch_size)
+
+
+def _keyset(after: str) -> tuple[str, str]:
+    return (">=", "") if after is None else (">", after)
+
+
+@metrics.timed(QUERY_TIMER, query="page_clients_with_purchases_sum")
+def page_clients_with_purchases_sum(cursor: Cursor, after: str = None, limit: int = PAGE_SIZE) -> list[tuple]:
+    """
+    Возвращает страницу клиентов с общей суммой их покупки, упорядоченную по имени.
+
+    Следующая страница запрашивается с after, равным имени последнего клиента текущей. Заказы без клиента
+    в постраничную выдачу не попадают.
+
+    :param cursor: курсор подключения к базе данных
+    :param after: имя клиента, после которого начинается страница, None - с начала
+    :param limit: размер страницы
+    :returns: список клиентов с общей суммой их покупки
+    """
+    op, key = _keyset(after)
+    cursor.execute(PAGE_CLIENTS_WITH_PURCHASES_SUM_QUERY.format(op=op), (key, limit))
+    return cursor.fetchall()
+
+
+@metrics.timed(QUERY_TIMER, query="page_clients_who_bought_phone")
+def page_clients_who_bought_phone(cursor: Cursor, after: str = None, limit: int = PAGE_SIZE) -> list[tuple]:
+    """
+    Возвращает страницу клиентов, которые купили телефон, упорядоченную по имени; каждый клиент - один раз.
+
+    :param cursor: курсор подключения к базе данных
+    :param after: имя клиента, после которого начинается страница, None - с начала
+    :param limit: размер страницы
+    :returns: список клиентов, которые купили телефон
+    """
+    op, key = _keyset(after)
+    cursor.execute(PAGE_CLIENTS_WHO_BOUGHT_PRODUCT_QUERY.format(op=op), (PHONE_PRODUCT_NAME, key, limit))
+    return cursor.fetchall()
+
+
+@metrics.timed(QUERY_TIMER, query="page_customs_count_by_name")
+def page_customs_count_by_name(cursor: Cursor, after: str = None, limit: int = PAGE_SIZE) -> list[tuple]:
+    """
+    Возвращает страницу товаров с количеством их заказа, упорядоченную по названию.
+
+    :param cursor: курсор подключения к базе данных
+    :param after: название товара, после которого начинается страница, None - с начала
+    :param limit: размер страницы
+    :returns: список товаров с количеством их заказа
+    """
+    op, key = _keyset(after)
+    cursor.execute(PAGE_CUSTOMS_COUNT_BY_NAME_QUERY.format(op=op), (key, limit))
+    return cursor.fetchall()
+
+
+@metrics.timed(QUERY_TIMER, query="clients_with_purchases_sum_from_summary")
+def return_clients_with_purchases_sum_from_summary(cursor: Cursor) -> list[tuple]:
+    """
+    Возвращает список клиентов с общей суммой их покупки из сводной таблицы client_totals.
+
+    Результат совпадает с return_clients_with_purchases_sum, но читается за O(клиентов), а не за O(заказов).
+
+    :param cursor: курсор подключения к базе данных
+    :returns: список клиентов с общей суммой их покупки
+    """
+    cursor.execute(SUMMARY_CLIENTS_WITH_PURCHASES_SUM_QUERY)
+    return cursor.fetchall()
+
+
+@metrics.timed(QUERY_TIMER, query="customs_count_by_name_from_summary")
+def return_customs_count_by_name_from_summary(cursor: Cursor) -> list[tuple]:
+    """
+    Возвращает список товаров с количеством их заказа из сводной таблицы product_order_counts.
+
+    Результат совпадает с return_customs_count_by_name, но читается за O(товаров), а не за O(заказов).
+
+    :param cursor: курсор подключения к базе данных
+    :returns: список товаров с количеством их заказа
+    """
+    cursor.execute(SUMMARY_CUSTOMS_COUNT_BY_NAME_QUERY)
+    return cursor.fetchall()
+
+
+@metrics.timed(LOAD_TIMER, table="summaries")
+def rebuild_summaries(cursor: Cursor) -> None:
+    """
+    Пересчитывает сводные таблицы client_totals и product_order_counts с нуля.
+
+    Нужна для заполнения сводных таблиц после загрузки данных в обход триггеров.
+
+    :param cursor: курсор подключения к базе данных
+    """
+    for statement in REBUILD_SUMMARIES_STATEMENTS:
+        cursor.execute(statement)
+    cursor.connection.commit()
+
+
+def compact_db(cursor: Cursor) -> dict[str, int]:
+    """
+    Удаляет дубли по естественным ключам, пересчитывает сводные таблицы и сжимает базу (VACUUM, ANALYZE).
+
+    Слияние дублей необратимо: заказы клиентов и товаров с одинаковыми именами перевешиваются на строку
+    с наименьшим id. Поэтому оно выполняется только этой функцией (python sql_task.py --compact), а не
+    миграцией схемы, которая на базе с дублями завершается ошибкой. Число удалённых строк пишется в лог.
+
+    :param cursor: курсор подключения к базе данных
+    :returns: словарь таблица -> число удалённых строк
+    """
+    tables = ("clients", "products", "orders")
+
+    def count_rows() -> dict[str, int]:
+        return {table: cursor.execute(f"SELECT COUNT(*) FROM {table};").fetchone()[0] for table in tables}
+
+    before = count_rows()
+    for statement in DEDUPE_STATEMENTS:
+        cursor.execute(statement)
+    cursor.connection.commit()
+    create_tables(cursor)
+    rebuild_summaries(cursor)
+    removed = {table: before[table] - count for table, count in count_rows().items()}
+    lg.get_logger().info(f"Удалены дубли: {removed}")
+    cursor.execute("VACUUM;")
+    cursor.execute("ANALYZE;")
+    cursor.connection.commit()
+    return removed
+
+
+def explain_query_plan(cursor: Cursor, query: str, parameters: tuple = ()) -> list[str]:
+    """
+    Возвращает план выполнения запроса.
+
+    :param cursor: курсор подключения к базе данных
+    :param query: текст запроса
+    :param parameters: параметры запроса
+    :returns: список шагов плана из EXPLAIN QUERY PLAN
+    """
+    cursor.execute(f"EXPLAIN QUERY PLAN {query}", parameters)
+    return [row[3] for row in cursor.fetchall()]
+
+
+class ReportRepository:
+    """
+    Слой доступа к данным поверх пула подключений.
+
+    Каждый вызов берёт подключение из пула, поэтому подключения и их кеш подготовленных выражений
+    переиспользуются между запросами.
+    """
+
+    def __init__(self, pool: sql_pool.ConnectionPool = None):
+        """
+        :param pool: пул подключений, по умолчанию sql_pool.get_pool()
+        """
+        self.pool = pool if pool is not None else sql_pool.get_pool()
+
+    def _run(self, func: callable, *args, **kwargs):
+        with self.pool.connection() as connection:
+            return func(*args, cursor=connection.cursor(), **kwargs)
+
+    def create_tables(self) -> None:
+        self._run(create_tables)
+
+    def fill(self, users: list[tuple], products: list[tuple], orders: list[tuple]) -> None:
+        self._run(fill_db, users, products, orders)
+
+    def compact(self) -> dict[str, int]:
+        return self._run(compact_db)
+
+    def clients_with_purchases_sum(self) -> list[tuple]:
+        return self._run(return_clients_with_purchases_sum)
+
+    def clients_who_bought_phone(self) -> list[tuple]:
+        return self._run(return_clients_who_bought_phone)
+
+    def customs_count_by_name(self) -> list[tuple]:
+        return self._run(return_customs_count_by_name)
+
+    def _iterate(self, func: callable, batch_size: int) -> Iterator[tuple]:
+        with self.pool.connection() as connection:
+            yield from func(connection.cursor(), batch_size)
+
+    def iter_clients_with_purchases_sum(self, batch_size: int = FETCH_SIZE) -> Iterator[tuple]:
+        return self._iterate(iter_clients_with_purchases_sum, batch_size)
+
+    def iter_clients_who_bought_phone(self, batch_size: int = FETCH_SIZE) -> Iterator[tuple]:
+        return self._iterate(iter_clients_who_bought_phone, batch_size)
+
+    def iter_customs_count_by_name(self, batch_size: int = FETCH_SIZE) -> Iterator[tuple]:
+        return self._iterate(iter_customs_count_by_name, batch_size)
+
+    def page_clients_with_purchases_sum(self, after: str = None, limit: int = PAGE_SIZE) -> list[tuple]:
+        return self._run(page_clients_with_purchases_sum, after=after, limit=limit)
+
+    def page_clients_who_bought_phone(self, after: str = None, limit: int = PAGE_SIZE) -> list[tuple]:
+        return self._run(page_clients_who_bought_phone, after=after, limit=limit)
+
+    def page_customs_count_by_name(self, after: str = None, limit: int = PAGE_SIZE) -> list[tuple]:
+        return self._run(page_customs_count_by_name, after=after, limit=limit)
+
+
+@connect_gracefully
+def rebuild_summaries_command(cursor: Cursor) -> None:
+    """
+    Команда пересчёта сводных таблиц в базе данных модуля.
+
+    :param cursor: курсор подключения к базе данных
+    """
+    create_tables(cursor)
+    rebuild_summaries(cursor)
+
+
+@connect_gracefully
+def compact_command(cursor: Cursor) -> None:
+    """
+    Команда удаления дублей и сжатия базы данных модуля.
+
+    :param cursor: курсор подключения к базе данных
+    """
+    compact_db(cursor)
+
+
+def get_cmd_args() -> argparse.Namespace:
+    """Парсер аргументов командной строки."""
+    parser = argparse.ArgumentParser(prog="Отчёты по заказам")
+    parser.add_argument("--db", default=sql_pool.DB_PATH, help="Путь к файлу базы данных")
+    parser.add_argument("--rebuild-summaries", action="store_true", help="Пересчитать сводные таблицы и выйти")
+    parser.add_argument("--compact", action="store_true", help="Удалить дубли, сжать базу (VACUUM, ANALYZE) и выйти")
+    metrics.add_cli_arguments(parser)
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    execute_functions()
+    args = get_cmd_args()
+    sql_pool.configure(args.db)
+    with metrics.cli_session(args):
+        if args.rebuild_summaries:
+            rebuild_summaries_command()
+        elif args.compact:
+            compact_command()
+        else:
+            execute_functions()
@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope="session")
+def log_dir(tmp_path_factory):
+    """Пишет логи тестов во временную директорию, а не в папку logs репозитория."""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        directory = tmp_path_factory.mktemp("logs")
+        monkeypatch.setenv("PIKTA_LOG_DIR", str(directory))
+        yield directory
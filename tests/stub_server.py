@@ -0,0 +1,49 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Заглушка сервиса ФНС: отвечает реквизитами по ifns/oktmmf, на ifns=0 - ошибкой 400."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode())
+        ifns, oktmmf = form["ifns"][0], form["oktmmf"][0]
+        self.server.requests.append((self.client_address, ifns, oktmmf))
+        body = {"payeeDetails": {"ifns": ifns, "oktmmf": oktmmf}} if ifns != "0" else {"ERRORS": {}}
+        status = 200 if ifns != "0" else 400
+        headers = {}
+        payload = json.dumps(body).encode()
+        plan = self.server.responses.get(ifns)
+        if plan:
+            status, headers, *raw = plan.pop(0)
+            payload = raw[0] if raw else payload
+        if self.server.delay:
+            threading.Event().wait(self.server.delay)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(delay: float = 0.0) -> ThreadingHTTPServer:
+    """Запускает заглушку на свободном порту в фоновом потоке; адрес - server.url."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.requests = []
+    server.delay = delay
+    # ifns -> список (код ответа, заголовки[, тело]), которые будут отданы по очереди перед обычным ответом
+    server.responses = {}
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/addrno-proc.json"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,40 @@
+import json
+import os
+import subprocess
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(SCRIPT_DIR, "..", "benchmarks"))
+
+import bench_json as bj
+
+
+def test_write_dump_matches_sap_schema(tmp_path):
+    path = bj.write_dump(str(tmp_path / "dump.json"), columns=6, rows=50, sparsity=0.2, numeric_share=0.5, seed=1)
+    header, rows = bj.jt.build_grid(*bj.jt.load_elements(path))
+    assert len(header) == 6 and 40 <= len(rows) <= 50
+    assert sum(value is None for row in rows for value in row) > 0
+    typed, _ = bj.jt.normalize_numeric_columns(header, rows)
+    numeric = [i for i, title in enumerate(header) if title.startswith("Сумма")]
+    assert len(numeric) == 3
+    values = [row[i] for row in typed for i in numeric if row[i] is not None]
+    assert all(isinstance(v, float) for v in values) and min(values) < 0
+
+
+def test_number_formats_are_parsed_back():
+    for fmt in bj.NUMBER_FORMATS.values():
+        assert bj.jt.parse_sap_numbers([bj.jt.fix_trailing_minus(fmt(-1234567.5))]) == [-1234567.5]
+
+
+def test_run_suite_measures_every_stage():
+    report = bj.run_suite([30], columns=4, repeats=1)
+    stages = report["results"][0]["stages"]
+    assert {"parse_json", "align", "normalize", "fill", "borders", "save", "streaming_write"} <= set(stages)
+    assert all(stage["peak_mib"] > 0 for stage in stages.values())
+
+
+def test_cli_prints_valid_json_report():
+    script = os.path.join(SCRIPT_DIR, "..", "benchmarks", "bench_json.py")
+    command = [sys.executable, script, "--rows", "30", "--columns", "4", "--repeats", "1", "--no-memory"]
+    report = json.loads(subprocess.run(command, capture_output=True, text=True, check=True).stdout)
+    assert report["results"][0]["rows"] == 30
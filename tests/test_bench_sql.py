@@ -0,0 +1,36 @@
+import json
+import os
+import subprocess
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(SCRIPT_DIR, "..", "benchmarks"))
+
+import bench_sql as bs
+
+
+def test_generate_dataset_is_skewed_and_deterministic():
+    users, products, orders = bs.generate_dataset(2000, seed=1)
+    orders = list(orders)
+    assert len(list(users)) == 100
+    assert len(orders) == 2000
+    assert any(name == bs.st.PHONE_PRODUCT_NAME for name, _ in products)
+    top_client = max(range(1, 101), key=[o[0] for o in orders].count)
+    assert [o[0] for o in orders].count(top_client) > 2000 / 100 * 5
+    assert orders == list(bs.generate_dataset(2000, seed=1)[2])
+
+
+def test_run_suite_reports_load_and_queries():
+    report = bs.run_suite([500], in_memory=False)
+    result = report["results"][0]
+    assert report["storage"] == "file"
+    assert result["load"]["tables"]["orders"]["rows"] == 500
+    assert set(result["queries"]) == set(bs.QUERIES)
+    assert result["queries"]["customs_count_by_name"]["rows"] > 0
+
+
+def test_cli_prints_valid_json_report():
+    script = os.path.join(SCRIPT_DIR, "..", "benchmarks", "bench_sql.py")
+    result = subprocess.run([sys.executable, script, "--sizes", "300"], capture_output=True, text=True, check=True)
+    report = json.loads(result.stdout)
+    assert report["results"][0]["load"]["tables"]["orders"]["rows"] == 300
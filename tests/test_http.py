@@ -1,14 +1,17 @@
+import json
 import os
 import sys
+import time
 from unittest.mock import patch
 
 import pytest
-from requests.exceptions import RequestException, Timeout
+from requests.exceptions import HTTPError, RequestException, Timeout
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.join(SCRIPT_DIR, ".."))
 
 import http_requests as hr
+from stub_server import start_stub_server
 
 
 @patch("requests.post")
@@ -30,3 +33,123 @@ def test_get_payment_details_timout_excetpion(mock_run):
     mock_run.side_effect = Timeout()
     with pytest.raises(Timeout):
         hr.get_payment_details(1, 2)
+
+
+@pytest.fixture
+def stub_server():
+    server = start_stub_server(delay=0.02)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_lookup_many_keeps_input_order(stub_server):
+    pairs = [(7700 + i, 45000000 + i) for i in range(40)] + [(0, 1)]
+    results = list(hr.lookup_many(pairs, workers=4, rate=0, url=stub_server.url))
+    assert [(r["ifns"], r["oktmmf"]) for r in results] == pairs
+    assert results[0]["payeeDetails"] == {"ifns": "7700", "oktmmf": "45000000"}
+    assert "error" in results[-1]
+    assert len({address for address, _, _ in stub_server.requests}) <= 4
+
+
+def test_host_rate_limiter_spaces_requests():
+    limiter = hr.HostRateLimiter(rate=50)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.wait("example")
+    assert time.monotonic() - start >= 5 / 50 * 0.9
+
+
+def test_run_batch_writes_jsonl(stub_server, tmp_path):
+    source = tmp_path / "pairs.jsonl"
+    source.write_text('{"ifns": 7707, "oktmmf": 45382000}\n\n{"ifns": "7701", "oktmmf": "45375000"}\n')
+    output = tmp_path / "out.jsonl"
+    assert hr.run_batch(str(source), str(output), workers=2, rate=0, url=stub_server.url) == 2
+    lines = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [line["ifns"] for line in lines] == [7707, 7701]
+    assert lines[1]["payeeDetails"]["oktmmf"] == "45375000"
+
+
+def test_fetch_retries_5xx_and_respects_retry_after(stub_server):
+    stub_server.responses["7707"] = [(503, {"Retry-After": "2"}), (502, {})]
+    delays, stats = [], hr.LatencyStats()
+    policy = hr.RequestPolicy(backoff=0.1)
+    details = hr.fetch_payment_details(7707, 1, url=stub_server.url, policy=policy, stats=stats, sleep=delays.append)
+    assert details == {"ifns": "7707", "oktmmf": "1"}
+    assert delays[0] == 2.0 and 0 <= delays[1] <= 0.2
+    assert [outcome for _, outcome in stats.attempts] == ["503", "502", "ok"]
+
+
+def test_fetch_does_not_retry_invalid_codes(stub_server):
+    breaker = hr.CircuitBreaker(failure_threshold=1)
+    with pytest.raises(hr.requests.exceptions.HTTPError):
+        hr.fetch_payment_details(0, 1, url=stub_server.url, breaker=breaker, sleep=lambda _: None)
+    assert len(stub_server.requests) == 1
+    assert breaker.state == "closed"
+
+
+def test_unexpected_status_raises_http_error(stub_server):
+    stub_server.responses["7707"] = [(204, {})]
+    with pytest.raises(hr.requests.exceptions.HTTPError, match="204"):
+        hr.get_payment_details(7707, 1, url=stub_server.url)
+
+
+def test_circuit_breaker_fails_fast_and_recovers(stub_server):
+    stub_server.responses["7707"] = [(500, {})] * 2
+    breaker = hr.CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+    policy = hr.RequestPolicy(retries=5)
+    with pytest.raises(hr.CircuitOpenError):
+        hr.fetch_payment_details(7707, 1, url=stub_server.url, policy=policy, breaker=breaker, sleep=lambda _: None)
+    assert len(stub_server.requests) == 2
+    assert breaker.state == "open"
+    time.sleep(0.15)
+    assert breaker.state == "half-open"
+    assert hr.fetch_payment_details(7707, 1, url=stub_server.url, breaker=breaker)["ifns"] == "7707"
+    assert breaker.state == "closed"
+
+
+def test_malformed_probe_response_does_not_wedge_breaker(stub_server):
+    stub_server.responses["7707"] = [(200, {}, b"<html>")]
+    breaker = hr.CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.1)
+    stats = hr.LatencyStats()
+    with pytest.raises(ValueError):
+        hr.fetch_payment_details(7707, 1, url=stub_server.url, breaker=breaker, stats=stats)
+    assert breaker.state == "open"
+    assert [outcome for _, outcome in stats.attempts] == ["JSONDecodeError"]
+    time.sleep(0.1)
+    assert hr.fetch_payment_details(7707, 1, url=stub_server.url, breaker=breaker)["ifns"] == "7707"
+    assert breaker.state == "closed"
+
+
+def test_breaker_classifies_invalid_codes_and_server_errors(stub_server):
+    stub_server.responses["7707"] = [(200, {}, b'{"ERRORS": {}}')] * 3 + [(501, {}), (200, {}, b"<html>")]
+    breaker = hr.CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    for _ in range(3):
+        with pytest.raises(KeyError):
+            hr.fetch_payment_details(7707, 1, url=stub_server.url, breaker=breaker)
+    with pytest.raises(HTTPError):
+        hr.fetch_payment_details(0, 1, url=stub_server.url, breaker=breaker)
+    assert breaker.state == "closed"
+    with pytest.raises(HTTPError):
+        hr.fetch_payment_details(7707, 1, url=stub_server.url, breaker=breaker)
+    with pytest.raises(ValueError):
+        hr.fetch_payment_details(7707, 1, url=stub_server.url, breaker=breaker)
+    assert breaker.state == "open"
+
+
+def test_policy_adapts_read_timeout():
+    policy = hr.RequestPolicy(min_read_timeout=0.5, read_timeout=10)
+    stats = hr.LatencyStats()
+    assert policy.timeout(stats) == (hr.CONNECT_TIMEOUT, 10)
+    for _ in range(20):
+        stats.record(0.4, "ok")
+    assert policy.timeout(stats) == (hr.CONNECT_TIMEOUT, pytest.approx(1.2))
+    assert hr.parse_retry_after("garbage") is None
+
+
+def test_lookup_many_rate_limits_network_requests(stub_server):
+    start = time.monotonic()
+    list(hr.lookup_many([(7700 + i, 1) for i in range(6)], workers=4, rate=50, url=stub_server.url))
+    assert time.monotonic() - start >= 5 / 50 * 0.9
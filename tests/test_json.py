@@ -1,8 +1,13 @@
+import csv
+import json
 import os
+import shutil
+import sqlite3
+import subprocess
 import sys
 
 import pytest
-from openpyxl import Workbook
+from openpyxl import Workbook, load_workbook
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.join(SCRIPT_DIR, ".."))
@@ -72,3 +77,273 @@ def test_add_borders_to_cells(data):
     for col in ws.iter_cols():
         for cell in col:
             assert cell.border.left.style is not None
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 16])
+def test_iter_json_elements_matches_json_load(chunk_size):
+    path = os.path.join(SCRIPT_DIR, "..", "test1.json")
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    expected = [(section, elem["properties"]) for section in data for elem in data[section]]
+    assert list(jt.iter_json_elements(path, chunk_size=chunk_size)) == expected
+
+
+def test_convert_jsons_to_xlsx_streaming(tmp_path, monkeypatch):
+    for file in ("test1.json", "test2.json"):
+        shutil.copy(os.path.join(SCRIPT_DIR, "..", file), tmp_path / file)
+    (tmp_path / "broken.json").write_text('{"headers": [{"smth": {}}]}', encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+    jt.convert_jsons_to_xlsx(["test1.json", "broken.json", "test2.json"], "out", streaming=True)
+
+    wb = load_workbook(tmp_path / "out.xlsx")
+    assert wb.sheetnames == ["test1", "test2"]
+    rows = [[cell.value for cell in row] for row in wb["test1"].iter_rows()]
+    assert rows[0] == ["Сумма во ВВ", "Внутренняя валюта", "Код налога", "Счет Главной книги"]
+    assert rows[2][0] == "- 4 200,00"
+    assert wb["test1"]["A1"].font.b
+    assert wb["test1"]["D3"].border.left.style == "thin"
+
+
+def test_prepare_sheet_data():
+    with open(os.path.join(SCRIPT_DIR, "..", "test1.json"), encoding="utf-8") as f:
+        header, rows = jt.prepare_sheet_data(json.load(f))
+    assert header == ["Сумма во ВВ", "Внутренняя валюта", "Код налога", "Счет Главной книги"]
+    assert rows == [[" 3 500,00", "RUB", "CH", "32-020010"], ["- 4 200,00", "RUB", "CH", "60-101000"]]
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_convert_jsons_to_xlsx_keeps_every_sheet(tmp_path, monkeypatch, workers):
+    for file in ("test1.json", "test2.json", "test3.json"):
+        shutil.copy(os.path.join(SCRIPT_DIR, "..", file), tmp_path / file)
+    (tmp_path / "broken.json").write_text('{"headers": [{"smth": {}}]}', encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+    jt.convert_jsons_to_xlsx(["test3.json", "broken.json", "test1.json", "test2.json"], "out", workers=workers)
+
+    wb = load_workbook(tmp_path / "out.xlsx")
+    assert wb.sheetnames == ["test3", "test1", "test2"]
+
+
+def test_convert_jsons_to_xlsx_parallel_reports_failures(tmp_path, monkeypatch):
+    shutil.copy(os.path.join(SCRIPT_DIR, "..", "test1.json"), tmp_path / "test1.json")
+    (tmp_path / "broken.json").write_text("{", encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+    failed = jt.convert_jsons_to_xlsx_parallel(["broken.json", "test1.json", "missing.json"], "out", 2)
+    assert [file for file, _ in failed] == ["broken.json", "missing.json"]
+    assert load_workbook(tmp_path / "out.xlsx").sheetnames == ["test1"]
+
+
+def _crash_on_broken(file):
+    if "broken" in file:
+        os._exit(1)
+    return jt.load_sheet_data(file)
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        '{"headers": [1]}',
+        '{"headers": [{"properties": {"X": null, "Y": "2", "Text": "", "QuickInfo": "A"}}]}',
+        "[]",
+    ],
+)
+@pytest.mark.parametrize("mode", [{}, {"streaming": True}, {"workers": 1}, {"workers": 2}])
+def test_wrongly_shaped_json_does_not_stop_batch(tmp_path, monkeypatch, content, mode):
+    shutil.copy(os.path.join(SCRIPT_DIR, "..", "test1.json"), tmp_path / "test1.json")
+    (tmp_path / "broken.json").write_text(content, encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+    jt.convert_jsons_to_xlsx(["broken.json", "test1.json"], "out", **mode)
+    assert load_workbook(tmp_path / "out.xlsx").sheetnames == ["test1"]
+
+
+@pytest.mark.parametrize("mode", [{}, {"streaming": True}, {"workers": 1}, {"output_format": "sqlite"}])
+def test_file_names_invalid_as_sheet_titles_are_cleaned(tmp_path, monkeypatch, mode):
+    files = ["bad[1].json", "what?.json", "x" * 40 + ".json", "X" * 40 + ".json", "test1.json"]
+    for file in files:
+        shutil.copy(os.path.join(SCRIPT_DIR, "..", "test1.json"), tmp_path / file)
+    monkeypatch.chdir(tmp_path)
+    jt.convert_jsons_to_xlsx(files, "out", **mode)
+    expected = ["bad_1_", "what_", "x" * 31, "X" * 29 + "_2", "test1"]
+    if mode.get("output_format") == "sqlite":
+        with sqlite3.connect(tmp_path / "out.sqlite") as connection:
+            tables = connection.execute("""SELECT name FROM sqlite_master WHERE type = 'table';""").fetchall()
+        assert [name for (name,) in tables] == expected
+    else:
+        assert load_workbook(tmp_path / "out.xlsx").sheetnames == expected
+
+
+def test_crashed_worker_is_reported_as_failure(tmp_path, monkeypatch):
+    shutil.copy(os.path.join(SCRIPT_DIR, "..", "test1.json"), tmp_path / "test1.json")
+    (tmp_path / "broken.json").write_text("{}", encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(jt, "load_sheet_data", _crash_on_broken)
+    failed = jt.convert_jsons_to_xlsx_parallel(["broken.json", "test1.json"], "out", 2)
+    assert "BrokenProcessPool" in failed[0][1]
+
+
+def test_build_grid_places_cells_by_coordinates():
+    headers = [jt.Element(20, 2, "", "B"), jt.Element(10, 2, "", "A")]
+    values = [jt.Element(20, 7, "b7"), jt.Element(10, 5, "a5"), jt.Element(22, 5, "12,5-"), jt.Element(10, 9, "a9")]
+    header, rows = jt.build_grid(headers, values)
+    assert header == ["A", "B"]
+    assert rows == [["a5", "-12,5"], [None, "b7"], ["a9", None]]
+
+
+def test_create_and_fill_sheet_matches_prepared_grid():
+    with open(os.path.join(SCRIPT_DIR, "..", "test3.json"), encoding="utf-8") as f:
+        data = json.load(f)
+    wb = Workbook()
+    jt.create_and_fill_sheet(data, wb, "test3")
+    header, rows = jt.prepare_sheet_data(data)
+    assert [[cell.value for cell in row] for row in wb["test3"].iter_rows()] == [header, *rows]
+
+
+@pytest.mark.parametrize(
+    "backend", ["json", pytest.param("orjson", marks=pytest.mark.skipif(jt.orjson is None, reason="no orjson"))]
+)
+def test_load_elements_projects_needed_fields(backend):
+    headers, values = jt.load_elements(os.path.join(SCRIPT_DIR, "..", "test1.json"), backend)
+    assert [(h.x, h.y, h.quick_info) for h in headers][0] == (28, 2, "Сумма во ВВ")
+    assert len(values) == 8
+    assert all(isinstance(v, jt.Element) for v in values)
+    assert not hasattr(values[0], "__dict__")
+
+
+def test_collect_sheet_rows_feeds_values_to_grid_as_they_are_parsed(tmp_path, monkeypatch):
+    values = [{"properties": {"X": str(x), "Y": str(y), "Text": f"{x}:{y}"}} for y in range(3, 8) for x in (10, 20)]
+    headers = [{"properties": {"X": str(x), "Y": "2", "Text": "", "QuickInfo": f"H{x}"}} for x in (10, 20)]
+    path = tmp_path / "dump.json"
+    build_grid = jt.build_grid
+    passed = []
+    monkeypatch.setattr(jt, "build_grid", lambda h, v: passed.append(v) or build_grid(h, v))
+    for dump in ({"headers": headers, "values": values}, {"values": values[:2], "headers": headers, "x": values[2:]}):
+        path.write_text(json.dumps(dump), encoding="utf-8")
+        assert jt.collect_sheet_rows(str(path)) == build_grid(*jt.load_elements(str(path), "json"))
+    assert not any(isinstance(v, list) for v in passed)
+
+    # Повторный ключ headers после значений: сетка уже строится, поэтому файл считается повреждённым.
+    h, v = json.dumps(headers), json.dumps(values)
+    path.write_text(f'{{"headers": {h}, "values": {v}, "headers": {h}}}', encoding="utf-8")
+    with pytest.raises(ValueError):
+        jt.collect_sheet_rows(str(path))
+
+
+def test_load_elements_streams_large_files_by_default(monkeypatch):
+    streamed = []
+    iter_json_elements = jt.iter_json_elements
+    monkeypatch.setattr(jt, "iter_json_elements", lambda file: streamed.append(file) or iter_json_elements(file))
+    monkeypatch.setattr(jt, "ORJSON_MAX_SIZE", 0)
+    headers, values = jt.load_elements(os.path.join(SCRIPT_DIR, "..", "test1.json"))
+    assert streamed and len(values) == 8
+
+
+@pytest.mark.parametrize("backend", ["json", None])
+def test_load_elements_for_exceptions(tmp_path, backend):
+    path = tmp_path / "broken.json"
+    path.write_text('{"headers": [{"smth": {"X": "1", "Y": "2", "Text": ""}}]}', encoding="utf-8")
+    with pytest.raises(KeyError):
+        jt.load_elements(str(path), backend)
+
+
+def test_json_task_does_not_import_pyarrow_at_startup():
+    code = "import sys, json_task; assert 'pyarrow' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], cwd=os.path.join(SCRIPT_DIR, ".."), check=True)
+
+
+def test_unique_column_names():
+    assert jt.unique_column_names(["A", "", "A", None, "A"]) == ["A", "column_2", "A_2", "column_4", "A_3"]
+    assert jt.unique_column_names(["Sum", "sum", "SUM_2"]) == ["Sum", "sum_2", "SUM_2_2"]
+
+
+def test_sqlite_writer_handles_case_duplicates_and_empty_header(tmp_path):
+    writer = jt.SqliteSheetWriter(str(tmp_path / "out"))
+    writer.add_sheet("sums", ["Sum", "sum"], [["1", "2"]])
+    writer.add_sheet("empty", [], [])
+    writer.close()
+    with sqlite3.connect(tmp_path / "out.sqlite") as connection:
+        assert connection.execute('SELECT * FROM "sums";').fetchall() == [("1", "2")]
+        assert connection.execute("""SELECT name FROM sqlite_master WHERE type = 'table';""").fetchall() == [("sums",)]
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_convert_jsons_to_csv(tmp_path, monkeypatch, streaming):
+    shutil.copy(os.path.join(SCRIPT_DIR, "..", "test1.json"), tmp_path / "test1.json")
+    monkeypatch.chdir(tmp_path)
+    jt.convert_jsons_to_xlsx(["test1.json"], "out", streaming=streaming, output_format="csv")
+    with open(tmp_path / "out_csv" / "test1.csv", encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["Сумма во ВВ", "Внутренняя валюта", "Код налога", "Счет Главной книги"]
+    assert rows[2] == ["- 4 200,00", "RUB", "CH", "60-101000"]
+
+
+def test_convert_jsons_to_sqlite(tmp_path, monkeypatch):
+    for file in ("test1.json", "test2.json"):
+        shutil.copy(os.path.join(SCRIPT_DIR, "..", file), tmp_path / file)
+    monkeypatch.chdir(tmp_path)
+    jt.convert_jsons_to_xlsx(["test1.json", "test2.json"], "out", output_format="sqlite")
+    jt.convert_jsons_to_xlsx(["test1.json", "test2.json"], "out", output_format="sqlite")
+    with sqlite3.connect(tmp_path / "out.sqlite") as connection:
+        cursor = connection.execute('SELECT * FROM "test1";')
+        assert [column[0] for column in cursor.description][0] == "Сумма во ВВ"
+        assert cursor.fetchall() == [(" 3 500,00", "RUB", "CH", "32-020010"), ("- 4 200,00", "RUB", "CH", "60-101000")]
+
+
+def test_convert_jsons_to_parquet(tmp_path, monkeypatch):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    shutil.copy(os.path.join(SCRIPT_DIR, "..", "test1.json"), tmp_path / "test1.json")
+    monkeypatch.chdir(tmp_path)
+    jt.convert_jsons_to_xlsx(["test1.json"], "out", output_format="parquet")
+    table = parquet.read_table(tmp_path / "out_parquet" / "test1.parquet")
+    assert table.column_names[0] == "Сумма во ВВ"
+    assert table.column("Сумма во ВВ").to_pylist() == [" 3 500,00", "- 4 200,00"]
+
+
+@pytest.mark.parametrize(
+    "values, expected",
+    [
+        ([" 3 500,00", "- 4 200,00"], True),
+        (["1.234,50-", "", None], True),
+        (["1000", "0001"], False),
+        (["32-020010", "60-101000"], False),
+        (["RUB", "1,00"], False),
+    ],
+)
+def test_is_numeric_column(values, expected):
+    assert jt.is_numeric_column(values) == expected
+
+
+def test_parse_sap_numbers():
+    assert jt.parse_sap_numbers([" 3 500,00", "1.234,5-", "- 4 200,00", "", "n/a"]) == [
+        3500.0,
+        -1234.5,
+        -4200.0,
+        None,
+        "n/a",
+    ]
+
+
+def test_convert_jsons_with_typed_numbers(tmp_path, monkeypatch):
+    shutil.copy(os.path.join(SCRIPT_DIR, "..", "test1.json"), tmp_path / "test1.json")
+    monkeypatch.chdir(tmp_path)
+    jt.convert_jsons_to_xlsx(["test1.json"], "out", typed_numbers=True)
+    ws = load_workbook(tmp_path / "out.xlsx")["test1"]
+    assert [ws["A2"].value, ws["A3"].value] == [3500, -4200]
+    assert ws["A2"].number_format == "#,##0.00"
+    assert ws["D3"].value == "60-101000"
+
+
+def test_normalize_keeps_column_with_late_text_as_strings():
+    rows = [["1,5", "2,125"], ["2,0", "3,0-"], ["n/a", "4"]]
+    typed, formats = jt.normalize_numeric_columns(["A", "B"], rows, sample_size=2)
+    assert [row[0] for row in typed] == ["1,5", "2,0", "n/a"]
+    assert [row[1] for row in typed] == [2.125, -3.0, 4.0]
+    assert formats == [None, "#,##0.000"]
+
+
+def test_parquet_accepts_column_with_late_text(tmp_path):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    header = ["Сумма"]
+    rows, formats = jt.normalize_numeric_columns(header, [["1,50"], ["2,00"], ["n/a"]], sample_size=2)
+    writer = jt.ParquetSheetWriter(str(tmp_path / "out"))
+    writer.add_sheet("sheet", header, rows, formats)
+    table = parquet.read_table(tmp_path / "out_parquet" / "sheet.parquet")
+    assert table.column("Сумма").to_pylist() == ["1,50", "2,00", "n/a"]
@@ -0,0 +1,85 @@
+import os
+import shutil
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(SCRIPT_DIR, ".."))
+
+from openpyxl import load_workbook
+
+import json_cache as jc
+import json_task as jt
+
+
+def copy_samples(tmp_path, *files):
+    for file in files:
+        shutil.copy(os.path.join(SCRIPT_DIR, "..", file), tmp_path / file)
+
+
+def test_grid_cache_reuses_unchanged_files(tmp_path, monkeypatch):
+    copy_samples(tmp_path, "test1.json")
+    monkeypatch.chdir(tmp_path)
+    cache = jc.GridCache()
+    grid, digest = cache.lookup("test1.json")
+    assert grid is None
+    cache.store("test1.json", digest, jt.load_sheet_data("test1.json"))
+    cache.save()
+
+    cache = jc.GridCache()
+    grid, _ = cache.lookup("test1.json")
+    assert grid == jt.load_sheet_data("test1.json")
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_grid_cache_detects_content_change(tmp_path, monkeypatch):
+    copy_samples(tmp_path, "test1.json", "test2.json")
+    monkeypatch.chdir(tmp_path)
+    cache = jc.GridCache()
+    _, digest = cache.lookup("test1.json")
+    cache.store("test1.json", digest, jt.load_sheet_data("test1.json"))
+
+    shutil.copy("test2.json", "test1.json")
+    os.utime("test1.json", ns=(0, 0))
+    grid, new_digest = cache.lookup("test1.json")
+    assert grid is None
+    assert new_digest != digest
+
+
+def test_grid_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    copy_samples(tmp_path, "test1.json", "test2.json", "test3.json")
+    monkeypatch.chdir(tmp_path)
+    cache = jc.GridCache(max_entries=2)
+    for file in ("test1.json", "test2.json", "test3.json"):
+        _, digest = cache.lookup(file)
+        cache.store(file, digest, jt.load_sheet_data(file))
+    cache.save()
+
+    cache = jc.GridCache(max_entries=2)
+    assert cache.lookup("test1.json")[0] is None
+    assert cache.lookup("test3.json")[0] is not None
+
+
+def test_convert_with_cache_skips_unchanged_output(tmp_path, monkeypatch):
+    copy_samples(tmp_path, "test1.json", "test2.json")
+    monkeypatch.chdir(tmp_path)
+    jt.convert_jsons_to_xlsx(["test1.json", "test2.json"], "out", cache=jc.GridCache())
+    mtime = os.stat("out.xlsx").st_mtime_ns
+
+    cache = jc.GridCache()
+    jt.convert_jsons_to_xlsx(["test1.json", "test2.json"], "out", cache=cache)
+    assert cache.misses == 0
+    assert os.stat("out.xlsx").st_mtime_ns == mtime
+
+    cache = jc.GridCache(rebuild=True)
+    jt.convert_jsons_to_xlsx(["test1.json", "test2.json"], "out", cache=cache)
+    assert cache.misses == 2
+
+
+def test_convert_with_cache_rebuilds_output_when_options_change(tmp_path, monkeypatch):
+    copy_samples(tmp_path, "test1.json")
+    monkeypatch.chdir(tmp_path)
+    jt.convert_jsons_to_xlsx(["test1.json"], "out", cache=jc.GridCache())
+    assert load_workbook("out.xlsx")["test1"]["A2"].value == " 3 500,00"
+
+    jt.convert_jsons_to_xlsx(["test1.json"], "out", cache=jc.GridCache(), typed_numbers=True)
+    assert load_workbook("out.xlsx")["test1"]["A2"].value == 3500
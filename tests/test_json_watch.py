@@ -0,0 +1,99 @@
+import os
+import shutil
+import sys
+import threading
+
+import pytest
+from openpyxl import load_workbook
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(SCRIPT_DIR, ".."))
+
+import json_task as jt
+import json_watch as jw
+
+
+def test_debouncer_waits_for_quiet_period(tmp_path):
+    path = tmp_path / "dump.json"
+    path.write_text("{", encoding="utf-8")
+    debouncer = jw.Debouncer(quiet_period=2)
+    debouncer.touch(str(path), now=0)
+    assert debouncer.ready(now=1) == []
+    path.write_text('{"headers": []}', encoding="utf-8")
+    assert debouncer.ready(now=2.5) == []
+    assert debouncer.ready(now=4.5) == [str(path)]
+    assert debouncer.ready(now=10) == []
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify есть только в Linux")
+def test_inotify_watcher_reports_dumps_only(tmp_path):
+    watcher = jw.InotifyWatcher(str(tmp_path))
+    try:
+        (tmp_path / "dump.json").write_text("{}", encoding="utf-8")
+        (tmp_path / ".dump.json.tmp").write_text("{}", encoding="utf-8")
+        (tmp_path / "notes.txt").write_text("", encoding="utf-8")
+        assert watcher.poll(1) == [str(tmp_path / "dump.json")]
+    finally:
+        watcher.close()
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify есть только в Linux")
+def test_inotify_watcher_rescans_after_queue_overflow(tmp_path, monkeypatch):
+    (tmp_path / "old.json").write_text("{}", encoding="utf-8")
+    watcher = jw.InotifyWatcher(str(tmp_path))
+    try:
+        (tmp_path / "new.json").write_text("{}", encoding="utf-8")
+        overflow = jw._INOTIFY_EVENT.pack(-1, jw.IN_Q_OVERFLOW, 0, 0)
+        monkeypatch.setattr(jw.os, "read", lambda fd, size: overflow)
+        assert watcher.poll(1) == [str(tmp_path / "new.json"), str(tmp_path / "old.json")]
+    finally:
+        watcher.close()
+
+
+def test_watch_daemon_debounces_fresh_dumps_at_startup(tmp_path):
+    source, output = tmp_path / "in", tmp_path / "out"
+    source.mkdir()
+    for name in ("idle.json", "fresh.json"):
+        shutil.copy(os.path.join(SCRIPT_DIR, "..", "test1.json"), source / name)
+    os.utime(source / "idle.json", (0, 0))
+    daemon = jw.WatchDaemon(str(source), str(output), workers=1, quiet_period=30, interval=0.05, polling=True)
+    daemon.run(timeout=0.5)
+    assert (daemon.converted, daemon.failed) == (1, 0)
+    assert os.listdir(output) == ["idle.xlsx"]
+
+
+@pytest.mark.parametrize("polling", [True, False])
+def test_watch_daemon_converts_new_dumps_once(tmp_path, polling):
+    source, output = tmp_path / "in", tmp_path / "out"
+    source.mkdir()
+    shutil.copy(os.path.join(SCRIPT_DIR, "..", "test1.json"), source / "test1.json")
+    daemon = jw.WatchDaemon(str(source), str(output), workers=1, quiet_period=0.1, interval=0.05, polling=polling)
+    thread = threading.Thread(target=daemon.run, kwargs={"timeout": 5})
+    thread.start()
+    try:
+        shutil.copy(os.path.join(SCRIPT_DIR, "..", "test2.json"), source / "test2.json")
+        (source / "broken.json").write_text('{"headers": [{"smth": {}}]}', encoding="utf-8")
+        while daemon.converted + daemon.failed < 3 and thread.is_alive():
+            thread.join(0.05)
+    finally:
+        daemon.stop()
+        thread.join()
+    assert (daemon.converted, daemon.failed) == (2, 1)
+    assert load_workbook(output / "test2.xlsx").sheetnames == ["test2"]
+    assert sorted(os.listdir(output)) == ["test1.xlsx", "test2.xlsx"]
+
+    restarted = jw.WatchDaemon(str(source), str(output), workers=1, quiet_period=0, interval=0.05, polling=True)
+    restarted.run(timeout=0.3)
+    assert restarted.converted == 0
+
+
+def test_atomic_output_keeps_old_file_on_error(tmp_path):
+    target = tmp_path / "out.xlsx"
+    target.write_text("old", encoding="utf-8")
+    with pytest.raises(RuntimeError):
+        with jt.atomic_output(str(target)) as tmp:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write("partial")
+            raise RuntimeError
+    assert target.read_text(encoding="utf-8") == "old"
+    assert os.listdir(tmp_path) == ["out.xlsx"]
@@ -0,0 +1,76 @@
+import logging
+import os
+import queue
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(SCRIPT_DIR, ".."))
+
+import logger as lg
+
+
+def make_record(message: str) -> logging.LogRecord:
+    return logging.LogRecord("test", logging.INFO, __file__, 1, message, None, None)
+
+
+@pytest.mark.parametrize(
+    "overflow, expected",
+    [("drop", ["first", "second"]), ("drop_oldest", ["second", "third"])],
+)
+def test_bounded_queue_handler_overflow(overflow, expected):
+    log_queue = queue.Queue(2)
+    handler = lg.BoundedQueueHandler(log_queue, overflow)
+    for message in ("first", "second", "third"):
+        handler.handle(make_record(message))
+    assert [log_queue.get_nowait().getMessage() for _ in range(2)] == expected
+    assert handler.dropped == 1
+
+
+def test_bounded_queue_handler_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        lg.BoundedQueueHandler(queue.Queue(1), "ignore")
+
+
+def test_setup_logging_flushes_on_shutdown(tmp_path):
+    try:
+        lg.setup_logging(console=False, queue_size=10, overflow="block", log_dir=str(tmp_path))
+        for i in range(50):
+            lg.get_logger().info(f"message {i}")
+        lg.shutdown()
+        (log_file,) = tmp_path.iterdir()
+        lines = log_file.read_text(encoding="utf-8").splitlines()
+        assert len(lines) == 50 and lines[-1].endswith("message 49")
+    finally:
+        lg.setup_logging(log_dir=os.environ["PIKTA_LOG_DIR"])
+
+
+def log_from_worker(message: str) -> None:
+    lg.get_logger().info(message)
+
+
+def test_pool_worker_records_reach_log_file(tmp_path):
+    try:
+        lg.setup_logging(console=False, log_dir=str(tmp_path))
+        with ProcessPoolExecutor(max_workers=1, initializer=lg.init_worker) as executor:
+            executor.submit(log_from_worker, "from worker").result()
+        lg.get_logger().info("from parent")
+        lg.shutdown()
+        text = (tmp_path / lg.LOG_FILE).read_text(encoding="utf-8")
+        assert "INFO - from worker" in text and "from parent" in text
+    finally:
+        lg.setup_logging(log_dir=os.environ["PIKTA_LOG_DIR"])
+
+
+def test_logging_is_configured_lazily(tmp_path):
+    log_dir = tmp_path / "logs"
+    env = dict(os.environ, PIKTA_LOG_DIR=str(log_dir), PIKTA_LOG_CONSOLE="0", PIKTA_LOG_LEVEL="debug")
+    code = (
+        "import os, logger; assert not os.path.exists(os.environ['PIKTA_LOG_DIR']); "
+        "logger.get_logger().debug('lazy')"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=os.path.join(SCRIPT_DIR, ".."), env=env, check=True)
+    assert "DEBUG - lazy" in (log_dir / lg.LOG_FILE).read_text(encoding="utf-8")
@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import sqlite3
+import sys
+
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(SCRIPT_DIR, ".."))
+
+import json_task as jt
+import metrics
+import sql_task as st
+
+
+@pytest.fixture
+def enabled_metrics():
+    metrics.REGISTRY.reset()
+    metrics.enable()
+    yield metrics.REGISTRY
+    metrics.enable(False)
+    metrics.REGISTRY.reset()
+
+
+def test_disabled_registry_records_nothing():
+    registry = metrics.Registry()
+    registry.inc("calls_total")
+    with registry.timer("stage_seconds", stage="parse"):
+        pass
+    assert registry.timer("stage_seconds") is metrics._NULL_TIMER
+    assert registry.snapshot() == {"counters": [], "timers": []}
+    assert registry.prometheus_text() == ""
+
+
+def test_registry_exports_prometheus_and_json(tmp_path):
+    registry = metrics.Registry(enabled=True)
+    registry.inc("files_total", 2, status="ok")
+    registry.inc("files_total", status="ok")
+    registry.observe("stage_seconds", 0.5, stage="fill")
+    registry.observe("stage_seconds", 1.5, stage="fill")
+    text = registry.prometheus_text()
+    assert '# TYPE files_total counter\nfiles_total{status="ok"} 3\n' in text
+    assert 'stage_seconds_count{stage="fill"} 2\nstage_seconds_sum{stage="fill"} 2.000000' in text
+    registry.write(str(tmp_path / "metrics.json"))
+    snapshot = json.loads((tmp_path / "metrics.json").read_text(encoding="utf-8"))
+    assert snapshot["timers"] == [
+        {"name": "stage_seconds", "labels": {"stage": "fill"}, "count": 2, "sum": 2.0, "max": 1.5}
+    ]
+
+
+def test_observe_and_timer_share_label_keys():
+    registry = metrics.Registry(enabled=True)
+    registry.observe("query_seconds", 0.5, query="a", db="main")
+    with registry.timer("query_seconds", db="main", query="a"):
+        pass
+    assert list(registry.timers) == [("query_seconds", (("db", "main"), ("query", "a")))]
+    assert registry.timers["query_seconds", (("db", "main"), ("query", "a"))][0] == 2
+
+
+def test_convert_jsons_records_stages(tmp_path, monkeypatch, enabled_metrics):
+    shutil.copy(os.path.join(SCRIPT_DIR, "..", "test1.json"), tmp_path / "test1.json")
+    monkeypatch.chdir(tmp_path)
+    jt.convert_jsons_to_xlsx(["test1.json"], "out")
+    stages = {timer["labels"]["stage"] for timer in enabled_metrics.snapshot()["timers"]}
+    assert stages == {"parse", "align", "fill", "borders", "save"}
+
+
+def test_sql_queries_and_loads_are_timed(enabled_metrics):
+    with sqlite3.connect(":memory:") as connection:
+        cursor = connection.cursor()
+        st.bulk_load(cursor, [("Иван",)], [("Мяч", 1)], [(1, 1, "Закупка")], tune=False)
+        st.return_customs_count_by_name(cursor=cursor)
+    snapshot = enabled_metrics.snapshot()
+    assert {"name": st.LOADED_ROWS_COUNTER, "labels": {"table": "orders"}, "value": 1} in snapshot["counters"]
+    assert {"query": "customs_count_by_name"} in [
+        t["labels"] for t in snapshot["timers"] if t["name"] == st.QUERY_TIMER
+    ]
+
+
+@pytest.mark.parametrize("kind", metrics.PROFILERS)
+def test_profile_logs_report(kind, tmp_path):
+    output = tmp_path / "run.prof"
+    with metrics.profile(kind, str(output)):
+        sorted(range(1000))
+    assert output.exists() == (kind == "cprofile")
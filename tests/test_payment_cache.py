@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+from unittest.mock import Mock
+
+import pytest
+import requests
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(SCRIPT_DIR, ".."))
+
+import http_requests as hr
+import payment_cache as pc
+from stub_server import start_stub_server
+
+
+def make_cache(tmp_path, fetch, **kwargs):
+    return pc.PaymentDetailsCache(str(tmp_path / "cache.sqlite"), fetch=fetch, **kwargs)
+
+
+def test_cache_hits_memory_and_disk(tmp_path):
+    fetch = Mock(return_value={"payeeName": "УФК"})
+    cache = make_cache(tmp_path, fetch)
+    assert cache.get(7707, 45382000) == {"payeeName": "УФК"}
+    assert cache.get("7707", "45382000") == {"payeeName": "УФК"}
+    cache.close()
+
+    cache = make_cache(tmp_path, fetch)
+    assert cache.get(7707, 45382000) == {"payeeName": "УФК"}
+    assert fetch.call_count == 1
+    assert cache.stats["hits"] == 1
+
+
+def test_cache_serves_stale_and_revalidates(tmp_path):
+    fetch = Mock(side_effect=[{"v": 1}, {"v": 2}])
+    cache = make_cache(tmp_path, fetch, ttl=0.2)
+    assert cache.get(1, 2) == {"v": 1}
+    time.sleep(0.25)
+    assert cache.get(1, 2) == {"v": 1}
+    for _ in range(100):
+        if fetch.call_count == 2 and not cache._refreshing:
+            break
+        time.sleep(0.01)
+    assert cache.get(1, 2) == {"v": 2}
+    assert cache.stats["stale_hits"] == 1
+
+
+def test_cache_remembers_invalid_codes(tmp_path):
+    response = requests.Response()
+    response.status_code = 400
+    fetch = Mock(side_effect=requests.exceptions.HTTPError("400", response=response))
+    cache = make_cache(tmp_path, fetch)
+    for _ in range(3):
+        with pytest.raises(hr.InvalidPaymentCodeError):
+            cache.get(0, 1)
+    assert fetch.call_count == 1
+    assert cache.stats["negative_hits"] == 2
+
+
+def test_cache_does_not_store_timeouts(tmp_path):
+    fetch = Mock(side_effect=[requests.exceptions.Timeout(), {"v": 1}])
+    cache = make_cache(tmp_path, fetch)
+    with pytest.raises(requests.exceptions.Timeout):
+        cache.get(1, 2)
+    assert cache.get(1, 2) == {"v": 1}
+
+
+def test_cache_warm_uses_stub_server(tmp_path):
+    server = start_stub_server()
+    try:
+        session = hr.create_session()
+        fetch = lambda ifns, oktmmf: hr.get_payment_details(ifns, oktmmf, session, server.url)  # noqa: E731
+        cache = make_cache(tmp_path, fetch)
+        assert cache.warm([(7701, 1), (7702, 2), (0, 3)], workers=2, rate=0) == {
+            "stored": 2,
+            "negative": 1,
+            "failed": 0,
+        }
+        requests_before = len(server.requests)
+        assert cache.get(7702, 2) == {"ifns": "7702", "oktmmf": "2"}
+        with pytest.raises(hr.InvalidPaymentCodeError):
+            cache.get(0, 3)
+        assert cache.warm([(7701, 1)], rate=0)["stored"] == 0
+        assert len(server.requests) == requests_before
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_batch_cache_hits_are_not_rate_limited(tmp_path):
+    fetch = Mock(return_value={"v": 1})
+    cache = make_cache(tmp_path, hr.rate_limited(fetch, rate=10))
+    cache.get(1, 2)
+    start = time.monotonic()
+    results = list(hr.lookup_many([(1, 2)] * 30, workers=4, rate=10, fetch=cache.get))
+    assert time.monotonic() - start < 1
+    assert all(result["payeeDetails"] == {"v": 1} for result in results)
+    assert fetch.call_count == 1
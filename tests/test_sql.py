@@ -1,6 +1,7 @@
 import os
 import sqlite3
 import sys
+import time
 
 import pytest
 
@@ -95,3 +96,297 @@ def test_return_customs_count_by_name(users_input, products_input, orders_input)
         assert len(customs) == len(products_input)
         for v in customs:
             assert int(v[1]) == 1
+
+
+def test_bulk_load_streams_generators_in_batches(tmp_path):
+    with sqlite3.connect(tmp_path / "bulk.db") as connection:
+        cursor = connection.cursor()
+        calls = []
+        stats = st.bulk_load(
+            cursor,
+            users=((f"Клиент {i}",) for i in range(10)),
+            products=[("Мяч", 299.99), ("Ручка", 18)],
+            orders=((i % 10 + 1, i % 2 + 1, f"Закупка {i}") for i in range(2500)),
+            batch_size=1000,
+            progress=lambda table, done, elapsed: calls.append((table, done)),
+        )
+        assert stats["orders"][0] == 2500
+        assert [done for table, done in calls if table == "orders"] == [1000, 2000, 2500]
+        cursor.execute("""SELECT COUNT(*) FROM orders;""")
+        assert cursor.fetchone()[0] == 2500
+        cursor.execute("""PRAGMA journal_mode;""")
+        assert cursor.fetchone()[0] == "delete"
+
+
+def test_bulk_insert_rolls_back_failed_batch():
+    with sqlite3.connect(":memory:") as connection:
+        cursor = connection.cursor()
+        st.create_tables(cursor)
+        with pytest.raises(sqlite3.Error):
+            st.bulk_insert(cursor, "products", [("Мяч", 1), ("Ручка",)], batch_size=10)
+        cursor.execute("""SELECT COUNT(*) FROM products;""")
+        assert cursor.fetchone()[0] == 0
+
+
+def test_migrate_schema_is_idempotent():
+    with sqlite3.connect(":memory:") as connection:
+        cursor = connection.cursor()
+        st.create_tables(cursor)
+        assert st.migrate_schema(cursor) == st.MIGRATIONS[-1][0]
+        cursor.execute("""SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%';""")
+        assert {"idx_orders_client_product", "idx_orders_product_client", "idx_products_name"} <= {
+            row[0] for row in cursor.fetchall()
+        }
+
+
+@pytest.mark.parametrize(
+    "query, parameters, expected",
+    [
+        (
+            st.CLIENTS_WITH_PURCHASES_SUM_QUERY,
+            (),
+            [
+                "SCAN orders USING COVERING INDEX idx_orders_product_client",
+                "SEARCH products USING INTEGER PRIMARY KEY (rowid=?) LEFT-JOIN",
+                "SEARCH clients USING INTEGER PRIMARY KEY (rowid=?) LEFT-JOIN",
+                "USE TEMP B-TREE FOR GROUP BY",
+            ],
+        ),
+        (
+            st.CLIENTS_WHO_BOUGHT_PRODUCT_QUERY,
+            (st.PHONE_PRODUCT_NAME,),
+            [
+                "SEARCH products USING COVERING INDEX idx_products_name (product_name=?)",
+                "SEARCH orders USING COVERING INDEX idx_orders_product_client (product_id=?)",
+                "SEARCH clients USING INTEGER PRIMARY KEY (rowid=?) LEFT-JOIN",
+            ],
+        ),
+        (
+            st.CUSTOMS_COUNT_BY_NAME_QUERY,
+            (),
+            [
+                "SCAN orders USING COVERING INDEX idx_orders_product_client",
+                "SEARCH products USING INTEGER PRIMARY KEY (rowid=?) LEFT-JOIN",
+                "USE TEMP B-TREE FOR GROUP BY",
+            ],
+        ),
+    ],
+)
+def test_report_queries_use_indexes(query, parameters, expected):
+    with sqlite3.connect(":memory:") as connection:
+        cursor = connection.cursor()
+        st.fill_db([("Иван",)], [("Телефон", 9999.9)], [(1, 1, "Закупка 1")], cursor)
+        assert st.explain_query_plan(cursor, query, parameters) == expected
+
+
+def test_clients_who_bought_phone_searches_products_by_name():
+    with sqlite3.connect(":memory:") as connection:
+        cursor = connection.cursor()
+        st.fill_db([("Иван",)], [("Телефон", 9999.9)], [(1, 1, "Закупка 1")], cursor)
+        plan = st.explain_query_plan(cursor, st.CLIENTS_WHO_BOUGHT_PRODUCT_QUERY, (st.PHONE_PRODUCT_NAME,))
+        assert plan[0] == "SEARCH products USING COVERING INDEX idx_products_name (product_name=?)"
+        assert plan[1].startswith("SEARCH orders USING COVERING INDEX idx_orders_product_client")
+
+
+def assert_summaries_match(cursor):
+    assert st.return_clients_with_purchases_sum_from_summary(cursor) == st.return_clients_with_purchases_sum(cursor)
+    assert st.return_customs_count_by_name_from_summary(cursor) == st.return_customs_count_by_name(cursor)
+
+
+def test_summaries_follow_order_changes():
+    with sqlite3.connect(":memory:") as connection:
+        cursor = connection.cursor()
+        st.fill_db(
+            [("Иван",), ("Константин",), ("Иван",)],
+            [("Мяч", 299.5), ("Ручка", 18), ("Телефон", 9999.25)],
+            [
+                (1, 1, "Закупка 1"),
+                (2, 3, "Закупка 2"),
+                (3, 2, "Закупка 3"),
+                (None, 2, "Закупка 4"),
+                (1, 7, "Закупка 5"),
+            ],
+            cursor,
+        )
+        assert_summaries_match(cursor)
+
+        cursor.execute("""UPDATE orders SET client_id = 2, product_id = 1 WHERE order_name = 'Закупка 1';""")
+        assert_summaries_match(cursor)
+        cursor.execute("""UPDATE products SET price = 20.5 WHERE product_name = 'Ручка';""")
+        assert_summaries_match(cursor)
+        cursor.execute("""INSERT INTO products(product_id, product_name, price) VALUES (7, 'Кофе', 159);""")
+        assert_summaries_match(cursor)
+        cursor.execute("""DELETE FROM products WHERE product_name = 'Телефон';""")
+        assert_summaries_match(cursor)
+        cursor.execute("""DELETE FROM orders WHERE client_id = 2;""")
+        assert_summaries_match(cursor)
+
+
+def test_summary_totals_match_live_sum_for_decimal_prices():
+    with sqlite3.connect(":memory:") as connection:
+        cursor = connection.cursor()
+        st.fill_db(
+            [("Иван",), ("Константин",)],
+            [("Спички", 0.1), ("Ручка", 19.99), ("Кофе", 0.07), ("Мяч", 1234.56)],
+            [(i % 2 + 1, i % 4 + 1, f"Закупка {i}") for i in range(200)],
+            cursor,
+        )
+        assert_summaries_match(cursor)
+        cursor.execute("""DELETE FROM orders WHERE order_id % 3 = 0;""")
+        assert_summaries_match(cursor)
+        cursor.execute("""UPDATE orders SET client_id = 1 WHERE order_id % 5 = 0;""")
+        assert_summaries_match(cursor)
+
+
+def test_rebuild_summaries_after_bypassing_triggers():
+    with sqlite3.connect(":memory:") as connection:
+        cursor = connection.cursor()
+        st.fill_db([("Иван",)], [("Мяч", 299.5)], [(1, 1, "Закупка 1")], cursor)
+        cursor.execute("""DELETE FROM client_totals;""")
+        assert st.return_clients_with_purchases_sum_from_summary(cursor) == []
+        st.rebuild_summaries(cursor)
+        assert_summaries_match(cursor)
+
+
+def test_load_time_is_linear_in_orders_per_client():
+    with sqlite3.connect(":memory:") as connection:
+        cursor = connection.cursor()
+        prices = [(f"Товар {i}", i + 0.07) for i in range(100)]
+        start = time.perf_counter()
+        st.bulk_load(
+            cursor,
+            users=[("Иван",), ("Константин",)],
+            products=prices,
+            orders=((i % 50 // 49 + 1, i % 100 + 1, f"Закупка {i}") for i in range(10**5)),
+            tune=False,
+        )
+        # Пересчёт суммы клиента на каждую вставку давал здесь десятки секунд.
+        assert time.perf_counter() - start < 10
+        assert_summaries_match(cursor)
+
+        start = time.perf_counter()
+        for i in range(10**4):
+            cursor.execute(st.LOAD_STATEMENTS["orders"], (1, i % 100 + 1, f"Заказ {i}"))
+        assert time.perf_counter() - start < 5
+        (total,) = cursor.execute("""SELECT total FROM client_totals WHERE client_id = 1;""").fetchone()
+        assert total == pytest.approx(st.return_clients_with_purchases_sum(cursor)[0][1])
+
+
+def test_interrupted_bulk_load_restores_triggers():
+    with sqlite3.connect(":memory:") as connection:
+        cursor = connection.cursor()
+        st.fill_db([("Иван",)], [("Мяч", 299.5)], [(1, 1, "Закупка 1")], cursor)
+        with pytest.raises(sqlite3.Error):
+            st.bulk_load(cursor, orders=[(1, 1, "Закупка 2"), (1, 1)], tune=False)
+        assert_summaries_match(cursor)
+        for name in st.ORDER_TRIGGER_NAMES:
+            cursor.execute(f"""DROP TRIGGER {name};""")
+        cursor.execute("""INSERT INTO orders(client_id, product_id, order_name) VALUES (1, 1, 'Закупка 3');""")
+        st.create_tables(cursor)
+        assert_summaries_match(cursor)
+        cursor.execute("""INSERT INTO orders(client_id, product_id, order_name) VALUES (1, 1, 'Закупка 4');""")
+        assert_summaries_match(cursor)
+
+
+def fill_many(cursor, clients=25, products=12):
+    st.fill_db(
+        [(f"Клиент {i:02}",) for i in range(clients)],
+        [(f"Товар {i:02}", float(i)) for i in range(products - 1)] + [("Телефон", 9999.9)],
+        [(i % clients + 1, i % products + 1, f"Закупка {i}") for i in range(clients * products)],
+        cursor,
+    )
+
+
+@pytest.mark.parametrize(
+    "iterate, full",
+    [
+        (st.iter_clients_with_purchases_sum, st.return_clients_with_purchases_sum),
+        (st.iter_clients_who_bought_phone, st.return_clients_who_bought_phone),
+        (st.iter_customs_count_by_name, st.return_customs_count_by_name),
+    ],
+)
+def test_iter_reports_match_fetchall(iterate, full):
+    with sqlite3.connect(":memory:") as connection:
+        cursor = connection.cursor()
+        fill_many(cursor)
+        rows = iterate(connection.cursor(), batch_size=4)
+        assert next(rows) == full(cursor)[0]
+        assert [full(cursor)[0], *rows] == full(cursor)
+
+
+@pytest.mark.parametrize(
+    "page, full",
+    [
+        (st.page_clients_with_purchases_sum, st.return_clients_with_purchases_sum),
+        (st.page_customs_count_by_name, st.return_customs_count_by_name),
+        (st.page_clients_who_bought_phone, st.return_clients_who_bought_phone),
+    ],
+)
+def test_keyset_pages_cover_report(page, full):
+    with sqlite3.connect(":memory:") as connection:
+        cursor = connection.cursor()
+        fill_many(cursor)
+        rows = []
+        after = None
+        while batch := page(cursor, after=after, limit=7):
+            assert len(batch) <= 7
+            rows.extend(batch)
+            after = batch[-1][0]
+        assert rows == sorted(set(full(cursor)))
+
+
+def test_repository_streams_rows():
+    repository = st.ReportRepository(st.sql_pool.ConnectionPool(":memory:", size=1))
+    repository.fill([("Иван",)], [("Телефон", 9999.9)], [(1, 1, "Закупка 1"), (1, 1, "Закупка 2")])
+    assert list(repository.iter_clients_who_bought_phone(batch_size=1)) == [("Иван",), ("Иван",)]
+    assert repository.page_clients_who_bought_phone() == [("Иван",)]
+
+
+def test_repeated_loads_are_idempotent(tmp_path):
+    with sqlite3.connect(tmp_path / "upsert.db") as connection:
+        cursor = connection.cursor()
+        fill_many(cursor)
+        report = st.return_clients_with_purchases_sum(cursor)
+        pages = cursor.execute("""PRAGMA page_count;""").fetchone()[0]
+        fill_many(cursor)
+        st.bulk_load(cursor, products=[("Телефон", 9999.9)], orders=[(1, 1, "Закупка 0")], tune=False)
+        counts = [cursor.execute(f"SELECT COUNT(*) FROM {t};").fetchone()[0] for t in ("clients", "products", "orders")]
+        assert counts == [25, 12, 300]
+        assert cursor.execute("""PRAGMA page_count;""").fetchone()[0] == pages
+        assert st.return_clients_with_purchases_sum(cursor) == report
+        st.fill_db([], [("Телефон", 5.0)], [], cursor)
+        assert_summaries_match(cursor)
+
+
+def test_compact_db_merges_duplicates_from_old_schema(monkeypatch):
+    with sqlite3.connect(":memory:") as connection:
+        cursor = connection.cursor()
+        monkeypatch.setattr(st, "MIGRATIONS", st.MIGRATIONS[:3])
+        st.create_tables(cursor)
+        cursor.executemany("""INSERT INTO clients(client_name) VALUES (?);""", [("Иван",), ("Иван",)])
+        cursor.executemany("""INSERT INTO products(product_name, price) VALUES (?, ?);""", [("Мяч", 100), ("Мяч", 150)])
+        cursor.executemany(
+            """INSERT INTO orders(client_id, product_id, order_name) VALUES (?, ?, ?);""",
+            [(1, 1, "Закупка 1"), (2, 2, "Закупка 1"), (2, 2, "Закупка 2")],
+        )
+        monkeypatch.undo()
+        assert st.compact_db(cursor) == {"clients": 1, "products": 1, "orders": 1}
+        assert st.return_clients_with_purchases_sum(cursor) == [("Иван", 300.0)]
+        assert_summaries_match(cursor)
+        with pytest.raises(sqlite3.IntegrityError):
+            cursor.execute("""INSERT INTO clients(client_name) VALUES ('Иван');""")
+
+
+def test_migration_does_not_merge_duplicates_implicitly(monkeypatch):
+    with sqlite3.connect(":memory:") as connection:
+        cursor = connection.cursor()
+        monkeypatch.setattr(st, "MIGRATIONS", st.MIGRATIONS[:3])
+        st.create_tables(cursor)
+        cursor.executemany("""INSERT INTO clients(client_name) VALUES (?);""", [("Иван",), ("Иван",)])
+        connection.commit()
+        monkeypatch.undo()
+        with pytest.raises(sqlite3.IntegrityError):
+            st.fill_db([("Иван",)], [], [], cursor)
+        assert cursor.execute("""PRAGMA user_version;""").fetchone()[0] == 3
+        assert cursor.execute("""SELECT COUNT(*) FROM clients;""").fetchone()[0] == 2
+        assert cursor.execute("""SELECT name FROM sqlite_master WHERE name = 'idx_clients_name';""").fetchone()
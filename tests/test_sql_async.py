@@ -0,0 +1,114 @@
+import asyncio
+import os
+import sqlite3
+import sys
+
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(SCRIPT_DIR, ".."))
+
+import sql_async as sa
+
+
+def test_async_reports_match_sync_queries(tmp_path):
+    async def run():
+        async with sa.AsyncReports(str(tmp_path / "async.db"), readers=2) as reports:
+            await reports.fill([("Иван",), ("Константин",)], [("Телефон", 9999.9)], [(1, 1, "Закупка 1")])
+            assert await reports.clients_with_purchases_sum() == [("Иван", 9999.9)]
+            assert await reports.clients_who_bought_phone() == [("Иван",)]
+            assert await reports.customs_count_by_name() == [("Телефон", 1)]
+
+    asyncio.run(run())
+
+
+def test_async_pages_match_full_reports(tmp_path):
+    async def run():
+        async with sa.AsyncReports(str(tmp_path / "async.db"), readers=2) as reports:
+            users = [(f"Клиент {i}",) for i in range(5)]
+            await reports.fill(
+                users, [("Телефон", 100.0), ("Мяч", 10.0)], [(i + 1, 1, f"Закупка {i}") for i in range(5)]
+            )
+            for page, full in (
+                (reports.page_clients_with_purchases_sum, reports.clients_with_purchases_sum),
+                (reports.page_clients_who_bought_phone, reports.clients_who_bought_phone),
+                (reports.page_customs_count_by_name, reports.customs_count_by_name),
+            ):
+                rows, after = [], None
+                while chunk := await page(after=after, limit=2):
+                    rows.extend(chunk)
+                    after = chunk[-1][0]
+                assert rows == await full()
+
+    asyncio.run(run())
+
+
+def test_async_reports_close_every_connection(tmp_path, monkeypatch):
+    connections = []
+    connect = sqlite3.connect
+
+    def tracked_connect(*args, **kwargs):
+        connections.append(connect(*args, **kwargs))
+        return connections[-1]
+
+    monkeypatch.setattr(sa.sqlite3, "connect", tracked_connect)
+
+    async def run():
+        async with sa.AsyncReports(str(tmp_path / "async.db"), readers=2) as reports:
+            await reports.clients_with_purchases_sum()
+
+    asyncio.run(run())
+    assert connections
+    for connection in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            connection.execute("SELECT 1;")
+
+
+def test_module_functions_use_configured_reports(tmp_path):
+    async def run():
+        await sa.fill_db([("Иван",)], [("Мяч", 299.99)], [(1, 1, "Закупка 1")])
+        return await sa.clients_with_purchases_sum()
+
+    sa.configure(str(tmp_path / "default.db"), readers=1)
+    try:
+        assert asyncio.run(run()) == [("Иван", 299.99)]
+    finally:
+        sa.get_reports().close()
+        sa._default_reports = None
+
+
+def test_async_reports_concurrency_stress(tmp_path):
+    clients = [(f"Клиент {i}",) for i in range(50)]
+    products = [("Телефон", 10.0), ("Мяч", 1.0)]
+
+    async def run():
+        async with sa.AsyncReports(str(tmp_path / "stress.db"), readers=4) as reports:
+            await reports.fill(clients, products, [])
+            ticks = 0
+            done = asyncio.Event()
+
+            async def ticker():
+                nonlocal ticks
+                while not done.is_set():
+                    ticks += 1
+                    await asyncio.sleep(0)
+
+            async def writer(batch):
+                orders = [(i % 50 + 1, i % 2 + 1, f"Закупка {batch}-{i}") for i in range(100)]
+                await reports.bulk_load(orders=orders, batch_size=25, tune=False)
+
+            async def reader():
+                counts = await reports.customs_count_by_name()
+                return sum(count for _, count in counts)
+
+            tick_task = asyncio.create_task(ticker())
+            results = await asyncio.gather(*[writer(b) for b in range(10)], *[reader() for _ in range(200)])
+            done.set()
+            await tick_task
+
+            totals = [r for r in results if r is not None]
+            assert all(0 <= total <= 1000 and total % 25 == 0 for total in totals)
+            assert sum(count for _, count in await reports.customs_count_by_name()) == 1000
+            assert ticks > 0
+
+    asyncio.run(run())
@@ -0,0 +1,62 @@
+import os
+import sys
+import threading
+
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(SCRIPT_DIR, ".."))
+
+import sql_pool as sp
+import sql_task as st
+
+
+def test_pool_reuses_connections(tmp_path):
+    pool = sp.ConnectionPool(str(tmp_path / "pool.db"), size=2, pragmas={"cache_size": -1024})
+    with pool.connection() as first:
+        assert first.execute("PRAGMA cache_size;").fetchone()[0] == -1024
+    with pool.connection() as second:
+        assert second is first
+    pool.close()
+
+
+def test_pool_limits_connections(tmp_path):
+    pool = sp.ConnectionPool(str(tmp_path / "pool.db"), size=1, timeout=0.05)
+    connection = pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+    pool.release(connection)
+    assert pool.acquire() is connection
+
+
+def test_pool_is_thread_safe(tmp_path):
+    pool = sp.ConnectionPool(str(tmp_path / "pool.db"), size=3)
+    repository = st.ReportRepository(pool)
+    repository.fill([("Иван",)], [("Телефон", 9999.9)], [(1, 1, "Закупка 1")])
+    results = []
+
+    def worker():
+        for _ in range(20):
+            results.append(repository.clients_who_bought_phone())
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [[("Иван",)]] * 120
+    assert pool._created <= 3
+
+
+def test_connect_gracefully_uses_configured_pool(tmp_path):
+    path = str(tmp_path / "configured.db")
+    sp.configure(path)
+    try:
+        st.rebuild_summaries_command()
+        repository = st.ReportRepository()
+        repository.fill([("Иван",)], [("Мяч", 299.99)], [(1, 1, "Закупка 1")])
+        assert repository.clients_with_purchases_sum() == [("Иван", 299.99)]
+        assert repository.customs_count_by_name() == [("Мяч", 1)]
+        assert os.path.exists(path)
+    finally:
+        sp.configure()